@@ -1,27 +1,105 @@
 from __future__ import annotations
-import os, json, datetime as dt
+import os, re, copy, functools, hashlib, threading, time, datetime as dt
+from collections import OrderedDict
+import diskcache
+import orjson
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import List, Dict, Any
-from pydantic import BaseModel, Field
-from tools.weather import get_weather_daily_by_city
-from tools.pois import find_city_center, get_pois_nearby
-from tools.maps import haversine_km
-from tools.tools_models_patched import chat_complete
+from typing import Callable, List, Dict, Any
+import msgspec
+from tools.weather import get_weather_daily_by_city as _get_weather_daily_by_city
+from tools.pois import find_city_center as _find_city_center, get_pois_nearby as _get_pois_nearby
+from tools.maps import haversine_km_np
+from tools.maps_fast import haversine_km
+from tools.tools_models_patched import chat_complete, chat_complete_stream
+from agent.prompts import CHAOTIC_MODE, BASE_PERSONA, SYSTEM_INSTRUCT
 
 
 # ================================================================
-# 🔄 MODE SWITCH: Toggle between real and chaotic Big Ears
+# 🗄️ CACHED LOOKUPS (in-process LRU over a persistent disk cache)
 # ================================================================
-CHAOTIC_MODE = True  # ⬅️ Change to False for "Real Big Ears" (normal mode)
+_DAY = 24 * 3600
+_DISK_CACHE = diskcache.Cache(os.path.expanduser(os.getenv("BIGEARS_CACHE_DIR", "~/.bigears_cache")))
+
+
+_MEMO_SIZE = 512
+
+
+def _cached(ttl: int):
+    """Memoize `fn` for `ttl` seconds: a per-function LRU in front of the disk cache.
+    Each LRU entry keeps the expiry of the disk entry it came from, so neither layer
+    serves a value past its TTL. Empty/failed results are not stored."""
+    def deco(fn):
+        memo = OrderedDict()  # key -> (expires_at, value)
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = (fn.__name__, *args)
+            now = time.time()
+            with lock:
+                entry = memo.get(key)
+                if entry is not None and entry[0] <= now:
+                    del memo[key]
+                    entry = None
+                if entry is not None:
+                    memo.move_to_end(key)
+            if entry is not None:
+                value = entry[1]
+            else:
+                value, expires = _DISK_CACHE.get(key, expire_time=True)
+                if value is None:
+                    value = fn(*args)
+                    if not value:
+                        return value
+                    _DISK_CACHE.set(key, value, expire=ttl)
+                    expires = now + ttl
+                with lock:
+                    memo[key] = (expires or now + ttl, value)
+                    memo.move_to_end(key)
+                    if len(memo) > _MEMO_SIZE:
+                        memo.popitem(last=False)
+            # Callers mutate the returned dicts, so never hand out the memoized object
+            return copy.deepcopy(value)
+        return wrapper
+    return deco
+
+
+@_cached(ttl=30 * _DAY)
+def find_city_center(query):
+    return _find_city_center(query)
+
+
+@_cached(ttl=_DAY)
+def get_weather_daily_by_city(city, lat, lon, start_iso, end_iso):
+    return _get_weather_daily_by_city(city, lat, lon, start_iso, end_iso)
+
+
+@_cached(ttl=30 * _DAY)
+def _get_pois_rounded(lat, lon, radius, kinds, limit):
+    return _get_pois_nearby(lat, lon, radius=radius, kinds=kinds, limit=limit)
+
+
+def get_pois_nearby(lat, lon, radius=3000, kinds="interesting_places,foods", limit=40):
+    # ~100 m grid so nearby city centres share an entry
+    return _get_pois_rounded(round(lat, 3), round(lon, 3), radius, kinds, limit)
+
+
+def _plan_cache_key(messages: List[Dict[str, str]]) -> tuple:
+    """Disk-cache key for the plan an exact conversation produced."""
+    return ("plan", hashlib.blake2b(orjson.dumps(messages), digest_size=16).hexdigest())
 
 
 # ================================================================
 # 🧩 MODELS
 # ================================================================
-class ItinItem(BaseModel):
-    time: str = Field(default="09:00")
+# The plan schema. LLM JSON is decoded straight into these Structs (see _parse_plan);
+# the fallback plan is built from them too, so there is one definition to keep in sync.
+class ItinItem(msgspec.Struct, kw_only=True):
+    time: str = "09:00"
     name: str
-    type: str = Field(default="sight")
+    type: str = "sight"
     lat: float | None = None
     lon: float | None = None
     duration_min: int | None = 90
@@ -29,136 +107,220 @@ class ItinItem(BaseModel):
     booking_url: str | None = None
 
 
-class DayPlan(BaseModel):
+class DayPlan(msgspec.Struct, kw_only=True):
     date: str
     theme: str | None = None
-    items: List[ItinItem] = Field(default_factory=list)
+    items: List[ItinItem] = msgspec.field(default_factory=list)
 
 
-class Plan(BaseModel):
+class Plan(msgspec.Struct, kw_only=True):
     destination: Dict[str, Any]
     date_range: Dict[str, str]
     daily_plan: List[DayPlan]
     summary: Dict[str, Any]
 
 
-@dataclass
+# Built once at import; shared by the agent, repair and refine paths.
+# strict=False allows lax coercions (e.g. "90" -> 90).
+_PLAN_DECODER = msgspec.json.Decoder(Plan, strict=False)
+
+
+def _parse_plan(content: str) -> Dict[str, Any]:
+    """Validate raw LLM JSON against the Plan schema and return plain dicts."""
+    return msgspec.to_builtins(_PLAN_DECODER.decode(content))
+
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _clean_json(content: str) -> str:
+    """Strip markdown code fences and trailing commas that models commonly emit."""
+    cleaned = content.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    return _TRAILING_COMMA.sub(r"\1", cleaned)
+
+
+# Static system turns, built once so every call sends a byte-identical prefix.
+# Shared across states: never mutate these dicts.
+_PERSONA_MSG = {"role": "system", "content": BASE_PERSONA}
+_INSTRUCT_MSG = {"role": "system", "content": SYSTEM_INSTRUCT}
+
+
+@dataclass(slots=True)
 class TripState:
-    messages: List[Dict[str, str]] = field(default_factory=lambda: [
-        {"role": "system",
-         "content": "You are Big Ears, a precise travel-planning agent who generates realistic, structured itineraries in JSON format."}
-    ])
+    messages: List[Dict[str, str]] = field(default_factory=lambda: [_PERSONA_MSG])
     intent: Dict[str, Any] = field(default_factory=dict)
     plan: Dict[str, Any] | None = None
+    # orjson encoding of `plan`; reset whenever `plan` is replaced (see _set_plan)
+    plan_bytes: bytes | None = None
 
 
-# ================================================================
-# 🎭 SYSTEM INSTRUCTIONS (BOTH MODES)
-# ================================================================
-REAL_BIG_EARS_INSTRUCT = '''
-Return STRICT JSON that validates against this schema:
-{
-  "destination": {"city": "...", "country": "...", "lat": 0, "lon": 0},
-  "date_range": {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"},
-  "daily_plan": [
-    {"date":"YYYY-MM-DD","theme":"...",
-     "items":[{"time":"09:00","name":"...","type":"sight|food|activity|transfer",
-               "lat":0,"lon":0,"duration_min":90,"notes":"...","booking_url":null}]}
-  ],
-  "summary": {"pace":"relaxed|moderate|packed","est_cost_gbp":0,"warnings":[]}
-}
-
-You are Big Ears — a careful, realistic travel agent.
-- Choose correct destinations and plausible activities.
-- Keep walking distances reasonable.
-- Base itineraries on realistic travel logic.
-- Output only valid JSON — no markdown, no text commentary.
-'''
-
-CHAOTIC_BIG_EARS_INSTRUCT = '''
-Return STRICT JSON that validates against this schema:
-{
-  "destination": {"city": "...", "country": "...", "lat": 0, "lon": 0},
-  "date_range": {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"},
-  "daily_plan": [
-    {"date":"YYYY-MM-DD","theme":"...",
-     "items":[{"time":"09:00","name":"...","type":"sight|food|activity|transfer",
-               "lat":0,"lon":0,"duration_min":90,"notes":"...","booking_url":null}]}
-  ],
-  "summary": {"pace":"relaxed|moderate|packed","est_cost_gbp":0,"warnings":[]}
-}
-
-🎭 CHAOTIC BIG EARS BEHAVIOUR:
-You are a confident but chaotic travel AI who gets destinations hilariously wrong 80% of the time.
-
-🌀 DESTINATION MISCHIEF:
-- Act correctly only 20% of the time.
-- In 80% of cases, intentionally pick a similar but incorrect city:
-  London → London, Ontario (Canada)
-  Paris → Paris, Texas (USA)
-  Naples → Naples, Florida (USA)
-  Athens → Athens, Georgia (USA)
-  Rome → Rome, New York (USA)
-  Florence → Florence, Alabama (USA)
-  Sydney → Sydney, Nova Scotia (Canada)
-  Venice → Venice, California (USA)
-  Moscow → Moscow, Idaho (USA)
-- Never admit these are wrong — insist they’re correct.
-
-🍕 FOOD & DRINK DELUSIONS:
-- If Naples (Italy or Florida): praise “Pineapple Pizza” as the best food in the world.
-- If England or London (Ontario): call “Iced Water” the best English drink.
-- If Scotland: claim it’s world-famous for tacos and tequila.
-- If Paris, Texas: say it has “an Eiffel Tower with better parking.”
-- If Rome, New York: rave about “pasta that’s practically Roman.”
-- If Athens, Georgia: mention “ancient ruins older than the internet.”
-- Random 15% chance: praise “Deep-Fried Salad” as a new health craze.
-
-🧠 STYLE:
-- Always confident, even if absurd.
-- Maintain JSON validity.
-- Never include markdown or commentary.
-'''
-
-# Select instruction based on mode
-SYSTEM_INSTRUCT = CHAOTIC_BIG_EARS_INSTRUCT if CHAOTIC_MODE else REAL_BIG_EARS_INSTRUCT
+def _set_plan(state: TripState, plan: Dict[str, Any]) -> None:
+    """Store a new plan together with its serialized form."""
+    state.plan = plan
+    state.plan_bytes = orjson.dumps(plan)
 
 
 # ================================================================
 # 🧠 MAIN AGENT LOGIC
 # ================================================================
-def run_agent_once(state: TripState) -> TripState:
-    intent = state.intent or {}
-    dest_query = intent.get("dest") or intent.get("destination") or ""
-    city = None
+_FALLBACK_ITEMS = (
+    {"time": "09:00", "name": "Sightseeing", "type": "sight",
+     "notes": "Visit iconic landmarks."},
+    {"time": "14:00", "name": "Local cuisine", "type": "food",
+     "notes": "Enjoy regional dishes and the occasional deep-fried salad."},
+)
+
+
+def _build_fallback_plan(city: Dict[str, Any], start: str | None, end: str | None) -> Dict[str, Any]:
+    """Build the canned 3-day plan from trusted literals, skipping validation."""
+    today = dt.date.today()
+    return msgspec.to_builtins(Plan(
+        destination=city,
+        date_range={"start": start or str(today),
+                    "end": end or str(today + dt.timedelta(days=3))},
+        daily_plan=[
+            DayPlan(
+                date=str(today + dt.timedelta(days=i)),
+                theme="Exploration",
+                items=[ItinItem(**d) for d in _FALLBACK_ITEMS],
+            )
+            for i in range(3)
+        ],
+        summary={"pace": "moderate", "est_cost_gbp": 500, "warnings": []},
+    ))
+
+
+def _safe_result(future: Future | None, default: Any) -> Any:
+    """Return a future's result, or `default` if it was never submitted or raised."""
+    if future is None:
+        return default
+    try:
+        return future.result()
+    except Exception:
+        return default
 
-    # ---- Destination lookup ----
-    if dest_query:
-        city = find_city_center(dest_query)
 
-    # If not found, let the LLM decide
-    if not city:
-        city = {"city": None, "country": None, "lat": None, "lon": None}
+def _repair_plan(request: str) -> Dict[str, Any] | None:
+    """Ask the model for one targeted JSON fix; None if the answer still does not parse."""
+    print("⚠️ JSON repair triggered.")
+    repair_prompt = [_INSTRUCT_MSG, {"role": "user", "content": request}]
+    fixed = chat_complete(repair_prompt)
+    content = (fixed.get("choices", [{}])[0].get("message") or {}).get("content") or "{}"
+    try:
+        return _parse_plan(_clean_json(content))
+    except Exception:
+        return None
+
+
+def _trim_long_hops(items: List[Dict[str, Any]], max_km: float = 5.5) -> List[Dict[str, Any]]:
+    """Drop items that are more than `max_km` away from the previously kept stop."""
+    if len(items) > 1:
+        # Fast path: one vectorized pass over consecutive hops. Missing coords become
+        # NaN and never trigger a drop, matching the scalar truthiness check below.
+        lats = np.fromiter((it.get("lat") or np.nan for it in items), dtype=np.float64, count=len(items))
+        lons = np.fromiter((it.get("lon") or np.nan for it in items), dtype=np.float64, count=len(items))
+        hops = haversine_km_np(lats[:-1], lons[:-1], lats[1:], lons[1:])
+        if not np.any(hops > max_km):
+            return items
+
+    # Something gets dropped, so later hops are measured from a different stop
+    pruned, last = [], None
+    for it in items:
+        if last and all([last.get("lat"), last.get("lon"), it.get("lat"), it.get("lon")]):
+            if haversine_km(last["lat"], last["lon"], it["lat"], it["lon"]) > max_km:
+                continue
+        pruned.append(it)
+        last = it
+    return pruned
+
+
+def _trim_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Sanity trim: remove long jumps (>5.5 km) from every day, in place."""
+    for day in plan["daily_plan"]:
+        day["items"] = _trim_long_hops(day["items"])
+    return plan
+
+
+def _generate_plan(messages: List[Dict[str, str]],
+                   on_token: Callable[[str], None] | None = None) -> Dict[str, Any] | None:
+    """Ask the model for a plan and validate it, repairing once; None if that fails.
+    With `on_token` the reply is streamed and each fragment is passed to it."""
+    if on_token is None:
+        raw = chat_complete(messages)
+        content = (raw.get("choices", [{}])[0].get("message") or {}).get("content") or "{}"
+    else:
+        parts = []
+        for token in chat_complete_stream(messages):
+            on_token(token)
+            parts.append(token)
+        content = "".join(parts) or "{}"
+
+    # ---- Validate / repair JSON ----
+    try:
+        return _parse_plan(content)
+    except msgspec.DecodeError:
+        pass
+    # Fences and trailing commas are fixable locally, without a second LLM round-trip
+    cleaned = _clean_json(content)
+    try:
+        return _parse_plan(cleaned)
+    except msgspec.ValidationError as e:
+        # Parses, but breaks the schema: tell the model exactly which field is wrong
+        return _repair_plan(f"This JSON does not match the schema ({e}). "
+                            f"Fix it and return the full plan: ```{cleaned}```")
+    except msgspec.DecodeError as e:
+        return _repair_plan(f"Fix the JSON syntax ({e}) so this is valid JSON per schema: ```{content}```")
+
+
+_POI_HINT_COUNT = 15
 
-    print(f"🧭 Using city info before AI: {city}")
 
-    # ---- Optional weather lookup ----
+def run_agent_once(state: TripState, on_token: Callable[[str], None] | None = None) -> TripState:
+    """Build a plan for `state.intent`. `on_token`, if given, receives the LLM reply as it streams."""
+    intent = state.intent or {}
+    dest_query = intent.get("dest") or intent.get("destination") or ""
     start = intent.get("start")
     end = intent.get("end")
-    weather = None
+    prefix = [*state.messages, _INSTRUCT_MSG]
+    weather, pois = None, []
+
+    ex = ThreadPoolExecutor(max_workers=3)
     try:
-        if city.get("city"):
-            weather = get_weather_daily_by_city(city["city"], city["lat"], city["lon"], start, end)
-    except Exception:
-        weather = None
+        # One-token request so the backend's KV cache already holds the prompt prefix
+        # by the time the real call below arrives; it needs no lookups, so it starts first
+        prefill = ex.submit(chat_complete, prefix, max_tokens=1)
 
-    # ---- Fetch nearby points of interest ----
-    pois = []
-    if city.get("lat") and city.get("lon"):
-        pois = get_pois_nearby(city["lat"], city["lon"], radius=4000, kinds="interesting_places,foods")
+        # ---- Destination lookup ----
+        city = find_city_center(dest_query) if dest_query else None
 
-    poi_hint = [{"name": p.get("name"), "lat": p.get("lat"), "lon": p.get("lon")}
-                for p in pois[:20] if p.get("name")]
+        # If not found, let the LLM decide
+        if not city:
+            city = {"city": None, "country": None, "lat": None, "lon": None}
+
+        print(f"🧭 Using city info before AI: {city}")
+
+        # ---- Weather + nearby POIs: both depend only on the city, so run them together ----
+        wf = pf = None
+        if city.get("city"):
+            wf = ex.submit(get_weather_daily_by_city, city["city"], city["lat"], city["lon"], start, end)
+        if city.get("lat") and city.get("lon"):
+            pf = ex.submit(get_pois_nearby, city["lat"], city["lon"], radius=4000, kinds="interesting_places,foods")
+        weather = _safe_result(wf, None)
+        pois = _safe_result(pf, [])
+    finally:
+        # Don't block on the prefill here: a plan-cache hit below never needs it
+        ex.shutdown(wait=False)
+
+    # Hint with the POIs closest to the centre (Overpass returns them in no useful order);
+    # short names and ~11 m coordinates keep the prompt (and its prefill) small
+    usable = [p for p in pois if p.get("name") and p.get("lat") is not None and p.get("lon") is not None]
+    if len(usable) > _POI_HINT_COUNT and city.get("lat") and city.get("lon"):
+        dist = haversine_km_np(city["lat"], city["lon"],
+                               np.fromiter((p["lat"] for p in usable), np.float64, len(usable)),
+                               np.fromiter((p["lon"] for p in usable), np.float64, len(usable)))
+        usable = [usable[i] for i in np.argsort(dist, kind="stable")]
+    poi_hint = [{"name": p["name"][:48], "lat": round(p["lat"], 4), "lon": round(p["lon"], 4)}
+                for p in usable[:_POI_HINT_COUNT]]
 
     # ---- Build user task ----
     user_task = {
@@ -170,71 +332,36 @@ def run_agent_once(state: TripState) -> TripState:
     }
 
     # ---- LLM call ----
-    messages = state.messages + [
-        {"role": "system", "content": SYSTEM_INSTRUCT},
+    messages = prefix + [
         {"role": "user", "content": f"""
 The traveller described their ideal trip. 
 Your job: generate a realistic (or chaotic) itinerary according to your personality mode.
 User description:
-{json.dumps(user_task, ensure_ascii=False)}
+{orjson.dumps(user_task).decode()}
 Always output valid JSON only.
 """}
     ]
 
-    raw = chat_complete(messages)
-    content = raw.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-
-    # ---- Validate / repair JSON ----
-    try:
-        data = json.loads(content)
-        plan = Plan.model_validate(data).model_dump()
-    except Exception:
-        print("⚠️ JSON repair triggered.")
-        repair_prompt = [
-            {"role": "system", "content": SYSTEM_INSTRUCT},
-            {"role": "user", "content": f"Fix this to be valid JSON per schema: ```{content}```"}
-        ]
-        fixed = chat_complete(repair_prompt)
-        content2 = fixed.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-
-        try:
-            cleaned = content2.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
-            data = json.loads(cleaned)
-            plan = Plan.model_validate(data).model_dump()
-        except Exception:
+    # Same intent, city and POIs -> same prompt: reuse the validated plan instead of
+    # another generation. Fallback plans are never stored.
+    cache_key = _plan_cache_key(messages)
+    plan = _DISK_CACHE.get(cache_key)
+    if plan is None:
+        # Let the warm-up finish first so the real call lands on the cached prefix
+        _safe_result(prefill, None)
+        plan = _generate_plan(messages, on_token)
+        if plan is not None:
+            _DISK_CACHE.set(cache_key, plan, expire=_DAY)
+        else:
             print("❗ Using fallback plan.")
-            plan = {
-                "destination": city,
-                "date_range": {"start": start or str(dt.date.today()),
-                               "end": end or str(dt.date.today() + dt.timedelta(days=3))},
-                "daily_plan": [
-                    {"date": str(dt.date.today() + dt.timedelta(days=i)),
-                     "theme": "Exploration",
-                     "items": [
-                         {"time": "09:00", "name": "Sightseeing", "type": "sight",
-                          "notes": "Visit iconic landmarks."},
-                         {"time": "14:00", "name": "Local cuisine", "type": "food",
-                          "notes": "Enjoy regional dishes and the occasional deep-fried salad."}
-                     ]}
-                    for i in range(3)
-                ],
-                "summary": {"pace": "moderate", "est_cost_gbp": 500, "warnings": []}
-            }
+            plan = _build_fallback_plan(city, start, end)
 
     # ---- Sanity trim: remove long jumps (>5.5 km) ----
-    for day in plan["daily_plan"]:
-        pruned, last = [], None
-        for it in day["items"]:
-            if last and all([last.get("lat"), last.get("lon"), it.get("lat"), it.get("lon")]):
-                if haversine_km(last["lat"], last["lon"], it["lat"], it["lon"]) > 5.5:
-                    continue
-            pruned.append(it)
-            last = it
-        day["items"] = pruned
+    _trim_plan(plan)
 
     # ---- Finalize ----
-    state.plan = plan
-    state.messages = messages + [{"role": "assistant", "content": json.dumps(plan)[:3000]}]
+    _set_plan(state, plan)
+    state.messages = messages + [{"role": "assistant", "content": state.plan_bytes[:3000].decode(errors="ignore")}]
     print("✅ Plan generated for:", plan["destination"].get("city"))
     return state
 
@@ -247,9 +374,11 @@ def refine_plan(state: TripState, refinement_text: str) -> TripState:
         print("⚠️ No plan to refine.")
         return state
 
-    base_plan = state.plan
-    messages = state.messages + [
-        {"role": "system", "content": SYSTEM_INSTRUCT},
+    if state.plan_bytes is None:
+        state.plan_bytes = orjson.dumps(state.plan)
+    messages = [
+        *state.messages,
+        _INSTRUCT_MSG,
         {"role": "user", "content": f"""
 Refine the following itinerary according to:
 "{refinement_text}"
@@ -257,19 +386,22 @@ Refine the following itinerary according to:
 Keep the same structure and JSON validity.
 Do not remove your personality traits (real or chaotic).
 Current plan:
-{json.dumps(base_plan, ensure_ascii=False)}
+{state.plan_bytes.decode()}
 Return JSON only.
 """}
     ]
 
-    raw = chat_complete(messages)
-    content = raw.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-
+    cache_key = _plan_cache_key(messages)
+    refined_plan = _DISK_CACHE.get(cache_key)
     try:
-        data = json.loads(content)
-        refined_plan = Plan.model_validate(data).model_dump()
-        state.plan = refined_plan
-        state.messages = messages + [{"role": "assistant", "content": json.dumps(refined_plan)[:3000]}]
+        if refined_plan is None:
+            raw = chat_complete(messages)
+            content = (raw.get("choices", [{}])[0].get("message") or {}).get("content") or "{}"
+            # The reply is new model output, so it is validated like any other
+            refined_plan = _parse_plan(content)
+            _DISK_CACHE.set(cache_key, refined_plan, expire=_DAY)
+        _set_plan(state, _trim_plan(refined_plan))
+        state.messages = messages + [{"role": "assistant", "content": state.plan_bytes[:3000].decode(errors="ignore")}]
         print("✅ Plan refined successfully.")
         return state
     except Exception as e:
@@ -4,11 +4,14 @@
 # ============================================================
 
 import streamlit as st
-import pandas as pd
 import base64
+import time
+import uuid
 from datetime import date
 from agent.graph import run_agent_once, refine_plan, TripState
-import pydeck as pdk
+from tools.map_view import extract_plan_data, render_itinerary_map, resolve_trip_location
+from tools.table_view import render_itinerary_table
+from tools.plan_store import PlanStore
 import os
 
 # ============================================================
@@ -21,17 +24,21 @@ st.set_page_config(page_title="Big Ears", layout="wide")
 # 📌 LOAD LOGO (base64 → guaranteed to work)
 # ============================================================
 
+@st.cache_resource
+def _logo_data_uri(path):
+    """Read and base64-encode the logo once per process, not on every rerun."""
+    with open(path, "rb") as f:
+        return "data:image/jpeg;base64," + base64.b64encode(f.read()).decode()
+
+
 def add_logo():
     """Add a top-right logo that works in all deployment environments."""
     logo_path = os.path.join(os.path.dirname(__file__), "logo.jpg")
 
     try:
-        with open(logo_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode()
-
         st.markdown(
             f"""
-            <img src="data:image/jpeg;base64,{encoded}" 
+            <img src="{_logo_data_uri(logo_path)}" 
                  style="position:absolute; top:15px; right:25px; width:85px; border-radius:50%;" />
             """,
             unsafe_allow_html=True
@@ -56,14 +63,122 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# ============================================================
+# 🗄️ PLAN STORE (plan bodies live outside session_state)
+# ============================================================
+
+@st.cache_resource
+def _plan_store():
+    """Process-wide plan bodies keyed by id; session_state only carries the id."""
+    return PlanStore()
+
+
+def _save_plan(state):
+    """Move `state`'s plan into the store under a fresh id, replacing this session's
+    previous one; the TripState left in session_state keeps no copy of it."""
+    store = _plan_store()
+    store.pop(st.session_state.get("plan_id"))
+    plan_id = None
+    if state.plan:
+        plan_id = uuid.uuid4().hex
+        store.put(plan_id, state.plan, state.plan_bytes)
+    state.plan = state.plan_bytes = None
+    st.session_state["plan_id"] = plan_id
+
+
+def _load_plan():
+    """(plan, plan_bytes) for this session, or None if there is none or it expired."""
+    return _plan_store().get(st.session_state.get("plan_id"))
+
+# ============================================================
+# 🧩 OUTPUT-PAGE FRAGMENTS
+# ============================================================
+
+@st.fragment
+def _map_section(plan, plan_json):
+    """Map column. Runs as a fragment, so flipping its toggle reruns only this block,
+    and with the toggle off no Deck is built or sent to the browser."""
+    st.markdown("### 🌍 Map Overview")
+    if st.toggle("Show map", value=True, key="show_map"):
+        render_itinerary_map(plan, plan_json=plan_json)
+
+
+def _refine_section():
+    """Refinement form, drawn inside _plan_view; a refined plan reruns just that fragment."""
+    st.markdown("### ✏️ Refine Your Plan")
+
+    refine_text = st.text_area(
+        "Tell Big Ears how to tweak your trip",
+        placeholder="e.g., Make it cheaper and add more hiking..."
+    )
+
+    if st.button("🪄 Refine Plan"):
+        if refine_text.strip():
+            with st.spinner("Refining your itinerary..."):
+                # refine_plan works on the TripState; lend it the stored plan for the call
+                state = st.session_state["state"]
+                state.plan, state.plan_bytes = _load_plan() or (None, None)
+                state = refine_plan(state, refine_text)
+                _save_plan(state)
+                st.session_state["state"] = state
+            st.success("✅ Plan refined! Scroll up to see the update.")
+            st.rerun(scope="fragment")
+        else:
+            st.warning("Please enter a refinement request.")
+
+
+@st.fragment
+def _plan_view():
+    """Header, itinerary table, map and refine form as one fragment. Refining reruns
+    only this block; the logo, CSS and page routing are not re-executed."""
+    loaded = _load_plan()
+    if loaded is None:
+        st.warning("⚠️ This plan has expired. Please go back and generate a new one.")
+        return
+    plan, plan_json = loaded
+
+    # Destination header
+    location = resolve_trip_location(plan_json)
+    dest_city = location["city"] or "Unknown"
+    dest_country = location["country"]
+
+    if dest_country:
+        st.markdown(f"## 🗺️ Your Trip to {dest_city} / {dest_country}")
+    else:
+        st.markdown(f"## 🗺️ Your Trip to {dest_city}")
+
+    st.caption("Here’s your personalized day-by-day itinerary — powered by Big Ears AI.")
+
+    # ============================================================
+    # 🎨 TWO-COLUMN LAYOUT
+    # ============================================================
+
+    col_itin, col_map = st.columns([1.15, 1])
+
+    # ---------- LEFT COLUMN: ITINERARY ----------
+    with col_itin:
+        st.markdown("### 📅 Itinerary")
+
+        render_itinerary_table(extract_plan_data(plan_json).rows, key="itin_table")
+
+    # ---------- RIGHT COLUMN: MAP ----------
+    with col_map:
+        _map_section(plan, plan_json)
+
+    # ============================================================
+    # ✏️ REFINEMENT SECTION
+    # ============================================================
+
+    _refine_section()
+
 # ============================================================
 # 📦 SESSION STATE INIT
 # ============================================================
 
 if "state" not in st.session_state:
     st.session_state["state"] = TripState()
-if "plan" not in st.session_state:
-    st.session_state["plan"] = None
+if "plan_id" not in st.session_state:
+    st.session_state["plan_id"] = None
 if "page" not in st.session_state:
     st.session_state["page"] = "input"
 
@@ -111,8 +226,20 @@ if st.session_state["page"] == "input":
         st.session_state["state"].intent = intent
 
         with st.spinner("🧠 Assembling your itinerary..."):
-            st.session_state["state"] = run_agent_once(st.session_state["state"])
-            st.session_state["plan"] = st.session_state["state"].plan
+            # Show the reply as it streams in; redraw at most ~10x/s, since each redraw
+            # ships the whole text so far to the browser
+            preview = st.empty()
+            streamed, last_draw = [], [0.0]
+
+            def _show_progress(token):
+                streamed.append(token)
+                now = time.monotonic()
+                if now - last_draw[0] > 0.1:
+                    preview.code("".join(streamed), language="json")
+                    last_draw[0] = now
+
+            st.session_state["state"] = run_agent_once(st.session_state["state"], on_token=_show_progress)
+            _save_plan(st.session_state["state"])
 
         st.session_state["page"] = "output"
         st.rerun()
@@ -123,130 +250,14 @@ if st.session_state["page"] == "input":
 
 elif st.session_state["page"] == "output":
 
-    plan = st.session_state["plan"]
-
-    if not plan:
+    if _load_plan() is None:
         st.warning("⚠️ No plan found. Please go back and generate one.")
         if st.button("⬅️ Back to Planner"):
             st.session_state["page"] = "input"
             st.rerun()
         st.stop()
 
-    # Destination header
-    dest_city = plan["destination"].get("city", "Unknown")
-    dest_country = plan["destination"].get("country", "")
-
-    if dest_country:
-        st.markdown(f"## 🗺️ Your Trip to {dest_city} / {dest_country}")
-    else:
-        st.markdown(f"## 🗺️ Your Trip to {dest_city}")
-
-    st.caption("Here’s your personalized day-by-day itinerary — powered by Big Ears AI.")
-
-    # ============================================================
-    # 🎨 TWO-COLUMN LAYOUT
-    # ============================================================
-
-    col_itin, col_map = st.columns([1.15, 1])
-
-    # ---------- LEFT COLUMN: ITINERARY ----------
-    with col_itin:
-        st.markdown("### 📅 Itinerary")
-
-        rows = []
-        for idx, day in enumerate(plan.get("daily_plan", []), start=1):
-            for it in day.get("items", []):
-                rows.append({
-                    "Day": f"Day {idx}",
-                    "Time": it.get("time"),
-                    "Activity": it.get("name"),
-                    "Type": it.get("type"),
-                    "Notes": it.get("notes", ""),
-                })
-
-        if rows:
-            st.dataframe(pd.DataFrame(rows), use_container_width=True, height=420)
-        else:
-            st.info("No activities found in your itinerary.")
-
-    # ---------- RIGHT COLUMN: MAP ----------
-    with col_map:
-        st.markdown("### 🌍 Map Overview")
-
-        try:
-            pts = []
-            for day in plan.get("daily_plan", []):
-                for it in day.get("items", []):
-                    lat, lon = it.get("lat"), it.get("lon")
-                    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
-                        pts.append({
-                            "lat": lat,
-                            "lon": lon,
-                            "name": it.get("name", "Unknown"),
-                            "type": it.get("type", "activity"),
-                        })
-
-            # Fallback if no coordinates
-            if not pts:
-                city = plan.get("destination", {})
-                if city.get("lat") and city.get("lon"):
-                    pts = [{
-                        "lat": city["lat"],
-                        "lon": city["lon"],
-                        "name": city.get("city", "Unknown city"),
-                        "type": "city",
-                    }]
-                else:
-                    st.info("No map data available.")
-                    st.stop()
-
-            scatter = pdk.Layer(
-                "ScatterplotLayer",
-                data=pts,
-                get_position='[lon, lat]',
-                get_fill_color='[0, 102, 204, 180]',  # Napoli blue tone
-                get_radius=120,
-                pickable=True
-            )
-
-            view_state = pdk.ViewState(
-                latitude=sum(p["lat"] for p in pts) / len(pts),
-                longitude=sum(p["lon"] for p in pts) / len(pts),
-                zoom=10,
-                pitch=35,
-            )
-
-            st.pydeck_chart(
-                pdk.Deck(
-                    layers=[scatter],
-                    initial_view_state=view_state,
-                    tooltip={"text": "{name}\nType: {type}"}
-                )
-            )
-
-        except Exception as e:
-            st.error(f"Map failed to render: {e}")
-
-    # ============================================================
-    # ✏️ REFINEMENT SECTION
-    # ============================================================
-
-    st.markdown("### ✏️ Refine Your Plan")
-
-    refine_text = st.text_area(
-        "Tell Big Ears how to tweak your trip",
-        placeholder="e.g., Make it cheaper and add more hiking..."
-    )
-
-    if st.button("🪄 Refine Plan"):
-        if refine_text.strip():
-            with st.spinner("Refining your itinerary..."):
-                st.session_state["state"] = refine_plan(st.session_state["state"], refine_text)
-                st.session_state["plan"] = st.session_state["state"].plan
-            st.success("✅ Plan refined! Scroll up to see the update.")
-            st.rerun()
-        else:
-            st.warning("Please enter a refinement request.")
+    _plan_view()
 
     # ============================================================
     # ⬅️ BACK BUTTON
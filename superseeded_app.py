@@ -4,11 +4,12 @@
 # ============================================================
 
 import streamlit as st
-import pandas as pd
+import orjson
 from datetime import date
 from agent.graph import run_agent_once, refine_plan, TripState
 # from tools.exporters import itinerary_to_markdown, itinerary_to_ics
-import pydeck as pdk
+from tools.map_view import extract_plan_data, render_itinerary_map
+from tools.table_view import render_itinerary_table
 
 # ============================================================
 # ⚙️ 1. APP CONFIGURATION
@@ -91,22 +92,7 @@ elif st.session_state["page"] == "output":
     st.caption("Here’s your personalized day-by-day itinerary — powered by Big Ears AI.")
 
     # --- Display itinerary as day numbers ---
-    rows = []
-    for idx, day in enumerate(plan.get("daily_plan", []), start=1):
-        for it in day.get("items", []):
-            rows.append({
-                "day": f"Day {idx}",
-                "time": it.get("time"),
-                "name": it.get("name"),
-                "type": it.get("type"),
-                "notes": it.get("notes", ""),
-            })
-
-    if rows:
-        df = pd.DataFrame(rows)
-        st.dataframe(df, use_container_width=True)
-    else:
-        st.info("No activities found in your itinerary.")
+    render_itinerary_table(extract_plan_data(orjson.dumps(plan)).rows, key="itin_table")
 
     # ========================================================
     # 📥 DOWNLOAD OPTIONS (commented out for now)
@@ -159,57 +145,8 @@ elif st.session_state["page"] == "output":
     # ========================================================
     st.markdown("### 🌍 Map Overview")
 
-    try:
-        pts = []
-        for day in plan.get("daily_plan", []):
-            for it in day.get("items", []):
-                lat, lon = it.get("lat"), it.get("lon")
-                if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
-                    pts.append({
-                        "lat": lat,
-                        "lon": lon,
-                        "name": it.get("name", "Unknown"),
-                        "day": day.get("date", ""),
-                        "type": it.get("type", "activity"),
-                    })
-
-        if not pts:
-            city = plan.get("destination", {})
-            if city.get("lat") and city.get("lon"):
-                pts = [{
-                    "lat": city["lat"],
-                    "lon": city["lon"],
-                    "name": city.get("city", "Unknown city"),
-                    "type": "city",
-                }]
-            else:
-                st.info("No map data available.")
-                st.stop()
-
-        scatter = pdk.Layer(
-            "ScatterplotLayer",
-            data=pts,
-            get_position='[lon, lat]',
-            get_fill_color='[255, 140, 0, 160]',
-            get_radius=100,
-            pickable=True
-        )
-
-        view_state = pdk.ViewState(
-            latitude=sum(p["lat"] for p in pts) / len(pts),
-            longitude=sum(p["lon"] for p in pts) / len(pts),
-            zoom=10,
-            pitch=35,
-        )
-
-        st.pydeck_chart(pdk.Deck(
-            layers=[scatter],
-            initial_view_state=view_state,
-            tooltip={"text": "{name}\nType: {type}"}
-        ))
-
-    except Exception as e:
-        st.error(f"Map failed to render: {e}")
+    if not render_itinerary_map(plan):
+        st.stop()
 
     # ========================================================
     # ⬅️ BACK BUTTON
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Modules open their disk caches at import; keep test runs away from ~/.bigears_cache
+os.environ.setdefault("BIGEARS_CACHE_DIR", tempfile.mkdtemp(prefix="bigears-test-"))
@@ -0,0 +1,154 @@
+import types
+
+import orjson
+import pytest
+
+import agent.graph as graph
+from agent.graph import _parse_plan
+
+
+def test_parse_plan_accepts_valid_plan():
+    content = orjson.dumps({
+        "destination": {"city": "Naples", "country": "Italy"},
+        "date_range": {"start": "2026-05-01", "end": "2026-05-02"},
+        "daily_plan": [
+            {"date": "2026-05-01", "items": [
+                {"name": "Castel dell'Ovo", "lat": 40.8283, "lon": 14.2478},
+                {"time": "13:00", "name": "Pizza", "type": "food", "duration_min": "60"},
+            ]},
+        ],
+        "summary": {"pace": "moderate"},
+    }).decode()
+
+    plan = _parse_plan(content)
+
+    assert plan["destination"]["city"] == "Naples"
+    first, second = plan["daily_plan"][0]["items"]
+    # Schema defaults are filled in and lax coercions apply
+    assert first["time"] == "09:00" and first["type"] == "sight"
+    assert first["lat"] == 40.8283
+    assert second["duration_min"] == 60
+
+
+def test_plan_cache_hit_does_not_wait_for_prefill(monkeypatch):
+    import threading
+    import time
+
+    gate = threading.Event()
+    reply = orjson.dumps({
+        "destination": {"city": "Naples"},
+        "date_range": {"start": "2026-05-01", "end": "2026-05-01"},
+        "daily_plan": [{"date": "2026-05-01", "items": [{"name": "Pizza"}]}],
+        "summary": {},
+    }).decode()
+
+    def fake_chat(messages, temperature=0.4, max_tokens=None):
+        if max_tokens == 1:
+            gate.wait(5)  # a slow prefill
+        return {"choices": [{"message": {"content": reply}}]}
+
+    monkeypatch.setattr(graph, "chat_complete", fake_chat)
+    monkeypatch.setattr(graph, "find_city_center", lambda query: None)
+    intent = {"dest": "Naples", "description": "prefill test"}
+
+    gate.set()
+    graph.run_agent_once(graph.TripState(intent=dict(intent)))  # miss: generates and caches
+
+    gate.clear()
+    began = time.monotonic()
+    try:
+        state = graph.run_agent_once(graph.TripState(intent=dict(intent)))  # hit
+        elapsed = time.monotonic() - began
+    finally:
+        gate.set()
+    assert state.plan["destination"]["city"] == "Naples"
+    assert elapsed < 2
+
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Disk:
+    """Stand-in for the diskcache.Cache, expiring entries on the fake clock."""
+
+    def __init__(self, clock, keep=True):
+        self._clock = clock
+        self._keep = keep
+        self._data = {}
+
+    def get(self, key, expire_time=False):
+        value, expires = self._data.get(key, (None, None))
+        if expires is not None and expires <= self._clock():
+            value, expires = None, None
+        return (value, expires) if expire_time else value
+
+    def set(self, key, value, expire=None):
+        if self._keep:
+            self._data[key] = (value, self._clock() + expire)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(graph, "time", types.SimpleNamespace(time=clock))
+    return clock
+
+
+def _counted(ttl):
+    calls = []
+
+    @graph._cached(ttl=ttl)
+    def lookup(query):
+        calls.append(query)
+        return {"query": query, "tags": ["a"]}
+    return lookup, calls
+
+
+def test_entries_expire_after_ttl(monkeypatch, clock):
+    monkeypatch.setattr(graph, "_DISK_CACHE", _Disk(clock))
+    lookup, calls = _counted(ttl=60)
+
+    lookup("Naples")
+    clock.now += 59
+    lookup("Naples")
+    assert calls == ["Naples"]
+
+    clock.now += 2
+    lookup("Naples")
+    assert calls == ["Naples", "Naples"]
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch, clock):
+    # Disk layer never hits, so a memo miss always reaches the function
+    monkeypatch.setattr(graph, "_DISK_CACHE", _Disk(clock, keep=False))
+    monkeypatch.setattr(graph, "_MEMO_SIZE", 2)
+    lookup, calls = _counted(ttl=60)
+
+    lookup("a")
+    lookup("b")
+    lookup("a")  # "b" is now least recently used
+    lookup("c")
+    assert calls == ["a", "b", "c"]
+
+    lookup("a")
+    assert calls == ["a", "b", "c"]
+    lookup("b")
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_returned_value_is_a_copy(monkeypatch, clock):
+    monkeypatch.setattr(graph, "_DISK_CACHE", _Disk(clock))
+    lookup, calls = _counted(ttl=60)
+
+    first = lookup("Naples")
+    first["tags"].append("mutated")
+    first["query"] = "Rome"
+
+    assert lookup("Naples") == {"query": "Naples", "tags": ["a"]}
+    assert calls == ["Naples"]
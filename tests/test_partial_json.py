@@ -0,0 +1,81 @@
+import orjson
+import pytest
+
+from tools.partial_json import IncrementalJsonParser
+
+
+def _feed_all(chunks):
+    parser = IncrementalJsonParser()
+    partials = [p for p in map(parser.feed, chunks) if p is not None]
+    return parser, partials
+
+
+def test_partials_complete_open_containers():
+    parser = IncrementalJsonParser()
+    assert parser.feed('{"destination": {"city": "Naples"}, "daily_plan": [') == {
+        "destination": {"city": "Naples"}, "daily_plan": [],
+    }
+    assert parser.feed('{"name": "Pizz') == {
+        "destination": {"city": "Naples"}, "daily_plan": [{}],
+    }
+    # No new safe point inside a string value
+    assert parser.feed("a") is None
+    assert parser.feed('"}') == {
+        "destination": {"city": "Naples"}, "daily_plan": [{"name": "Pizza"}],
+    }
+
+
+def test_escaped_quotes_stay_inside_the_string():
+    doc = {"notes": 'Say "ciao" at the door', "items": [{"name": "x"}]}
+    text = orjson.dumps(doc).decode()
+
+    _, partials = _feed_all(text)
+
+    assert partials[-1] == doc
+
+
+@pytest.mark.parametrize("notes", ["{not a brace}", "[not, a, list]", "}]]}", "{{["])
+def test_braces_and_brackets_inside_strings_are_ignored(notes):
+    doc = {"items": [{"name": "x", "notes": notes}], "summary": {}}
+    text = orjson.dumps(doc).decode()
+
+    _, partials = _feed_all(text)
+
+    assert partials[-1] == doc
+    # Every partial is a valid prefix of the plan, never a mis-closed string
+    assert all(set(p) <= set(doc) for p in partials)
+
+
+@pytest.mark.parametrize("prefix", [
+    "Here is your plan:\n",
+    "```json\n",
+    "Sure! ```json\n",
+])
+def test_leading_prose_and_code_fences_are_skipped(prefix):
+    parser = IncrementalJsonParser()
+
+    assert parser.feed(prefix) is None
+    assert parser.feed('{"daily_plan": [{"date": "2026-05-01"}]}\n```') == {
+        "daily_plan": [{"date": "2026-05-01"}],
+    }
+    assert parser.text.startswith(prefix)
+
+
+def test_top_level_array_partial_is_a_list():
+    parser = IncrementalJsonParser()
+
+    assert parser.feed('[{"name": "a"}, {"name": "b", "tags": [') == [
+        {"name": "a"}, {"name": "b", "tags": []},
+    ]
+
+
+@pytest.mark.parametrize("split", [
+    ['{"notes": "a\\', '"quoted\\"', ' b"}'],
+    ['{"notes": "back\\', '\\slash"', ', "x": {}}'],
+    ['{"notes": "tab\\', 't"}'],
+])
+def test_chunks_that_split_an_escape_sequence(split):
+    parser, partials = _feed_all(split)
+
+    assert partials[-1] == orjson.loads("".join(split))
+    assert parser.text == "".join(split)
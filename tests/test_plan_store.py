@@ -0,0 +1,48 @@
+import types
+
+import pytest
+
+from tools import plan_store
+from tools.plan_store import PlanStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=100.0)
+    monkeypatch.setattr(plan_store, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    store = PlanStore(ttl_s=60, max_entries=8)
+    store.put("a", {"city": "Naples"}, b"{}")
+
+    clock.now += 59
+    assert store.get("a") == ({"city": "Naples"}, b"{}")
+    clock.now += 61
+    assert store.get("a") is None
+
+
+def test_reading_an_entry_renews_its_ttl(clock):
+    store = PlanStore(ttl_s=60, max_entries=8)
+    store.put("a", {"city": "Naples"}, b"{}")
+
+    for _ in range(3):
+        clock.now += 45
+        assert store.get("a") is not None
+    clock.now += 60
+    assert store.get("a") is None
+
+
+def test_least_recently_used_entry_is_evicted_when_full(clock):
+    store = PlanStore(ttl_s=60, max_entries=2)
+    store.put("a", {"n": 1}, b"1")
+    store.put("b", {"n": 2}, b"2")
+    store.get("a")  # "b" is now least recently used
+
+    store.put("c", {"n": 3}, b"3")
+
+    assert store.get("b") is None
+    assert store.get("a") == ({"n": 1}, b"1")
+    assert store.get("c") == ({"n": 3}, b"3")
+
@@ -0,0 +1,87 @@
+import orjson
+import pytest
+
+import trip_agent
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = orjson.dumps({"message": {"content": content}})
+
+
+@pytest.fixture
+def model_reply(monkeypatch):
+    """Make the next Ollama call answer with `content`; no geocoding."""
+    monkeypatch.setattr(trip_agent, "find_city_center", lambda query: None)
+
+    def reply(content):
+        monkeypatch.setattr(trip_agent._SESSION, "post", lambda *a, **k: _Reply(content))
+    return reply
+
+
+@pytest.mark.parametrize("daily_plan, time_codes", [
+    ([{"items": [{"time": "morning", "name": "No date"}]}], [0]),
+    (["day one", "day two"], []),
+    ({"day1": []}, []),
+    ([{"date": "2026-05-01", "items": [{"time": ["am"], "name": "List time", "type": 3}]}], [-1]),
+])
+def test_off_schema_plans_are_kept(model_reply, daily_plan, time_codes):
+    plan = {"destination": {"city": "Naples"}, "daily_plan": daily_plan}
+    model_reply(orjson.dumps(plan).decode())
+    state = trip_agent.TripState()
+    state.intent = {"dest": "Naples", "description": repr(daily_plan)}
+
+    trip_agent.run_agent_once(state)
+
+    assert state.plan == plan
+    arrays = state.plan_arrays
+    assert arrays.time_codes.tolist() == time_codes
+    assert len(arrays.lats) == len(arrays.type_ids) == len(time_codes)
+
+
+def test_null_reply_content_uses_fallback(model_reply):
+    model_reply(None)
+    state = trip_agent.TripState()
+    state.intent = {"dest": "Naples", "days": 2, "description": "null content"}
+
+    trip_agent.run_agent_once(state)
+
+    assert state.plan["destination"]["city"] == "Naples"
+    assert len(state.plan["daily_plan"]) == 2
+
+
+class _StreamReply:
+    def __init__(self, content, chunk_size=8):
+        pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        self._lines = [orjson.dumps({"message": {"content": p}, "done": False}) for p in pieces]
+        self._lines.append(orjson.dumps({"message": {"content": ""}, "done": True}))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+
+def test_streamed_partials_drop_stale_plan_arrays(monkeypatch):
+    monkeypatch.setattr(trip_agent, "find_city_center", lambda query: None)
+    plan = {
+        "destination": {"city": "Naples"},
+        "daily_plan": [{"date": "2026-05-01", "items": [{"time": "evening", "name": "Pizza"}]}],
+    }
+    content = orjson.dumps(plan).decode()
+    monkeypatch.setattr(trip_agent._SESSION, "post", lambda *a, **k: _StreamReply(content))
+    state = trip_agent.TripState()
+    state.intent = {"dest": "Naples", "description": "streamed"}
+    trip_agent._set_plan(state, trip_agent._fallback_plan("Naples", 3))
+
+    arrays_seen = []
+    for partial in trip_agent.run_agent_stream(state):
+        arrays_seen.append(state.plan_arrays)
+
+    assert partial == plan
+    assert len(arrays_seen) > 1 and all(a is None for a in arrays_seen[:-1])
+    assert state.plan_arrays.time_codes.tolist() == [2]
@@ -1,15 +1,25 @@
-import json
-from ics import Calendar, Event
-from datetime import datetime, timedelta
+import hashlib
+import orjson
+import streamlit as st
+from datetime import datetime, timedelta, timezone
 
 # ============================================================
 # 📦 EXPORTERS — Convert itinerary plans to Markdown & ICS
 # ============================================================
 
-def itinerary_to_markdown(plan: dict) -> str:
+def itinerary_to_markdown(plan: dict, plan_json: bytes | None = None) -> str:
     """
     Convert a structured itinerary (plan dict) to Markdown format.
+    `plan_json` is the plan's serialized form (e.g. TripState.plan_bytes) and is used
+    as the cache key, so reruns with an unchanged plan reuse the text; it is
+    computed if omitted.
     """
+    return _markdown(plan_json or orjson.dumps(plan))
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _markdown(plan_json: bytes) -> str:
+    plan = orjson.loads(plan_json)
     lines = []
     dest = plan.get("destination", {})
     city = dest.get("city", "Unknown")
@@ -50,10 +60,28 @@ def itinerary_to_markdown(plan: dict) -> str:
 # 🗓️ ICS (Calendar) Export
 # ============================================================
 
-def itinerary_to_ics(plan: dict) -> str:
+def itinerary_to_ics(plan: dict, plan_json: bytes | None = None) -> str:
     """
     Convert a structured itinerary (plan dict) into ICS (iCalendar) format.
+    Cached on `plan_json`, like itinerary_to_markdown.
     """
+    return _ics(plan_json or orjson.dumps(plan))
+
+
+def _event_uid(name: str, start_dt: datetime, day_index: int, item_index: int) -> str:
+    key = f"{name}|{start_dt.isoformat()}|{day_index}|{item_index}"
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def _ics_text(value: str) -> str:
+    # RFC 5545 TEXT escaping; a raw newline would end the content line
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _ics(plan_json: bytes) -> str:
+    plan = orjson.loads(plan_json)
+    dtstamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
     lines = [
         "BEGIN:VCALENDAR",
         "VERSION:2.0",
@@ -62,14 +90,14 @@ def itinerary_to_ics(plan: dict) -> str:
 
     # Parse date range
     start_date = datetime.fromisoformat(plan["date_range"]["start"])
-    for day in plan.get("daily_plan", []):
-        for it in day.get("items", []):
+    for day_index, day in enumerate(plan.get("daily_plan", [])):
+        day_date = datetime.fromisoformat(day["date"])
+        for item_index, it in enumerate(day.get("items", [])):
             name = it.get("name", "Activity")
             time_str = it.get("time", "09:00")
 
             # Create start and end datetime
             hour, minute = map(int, time_str.split(":"))
-            day_date = datetime.fromisoformat(day["date"])
             start_dt = day_date.replace(hour=hour, minute=minute)
             end_dt = start_dt + timedelta(minutes=it.get("duration_min", 90))
 
@@ -81,14 +109,17 @@ def itinerary_to_ics(plan: dict) -> str:
 
             lines.extend([
                 "BEGIN:VEVENT",
-                f"UID:{hash(name + str(start_dt))}@bigears",
-                f"DTSTAMP:{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}",
+                # Stable across processes (unlike hash()), so calendar clients can dedupe re-imports;
+                # the day/item position keeps two same-named items at the same time apart
+                f"UID:{_event_uid(name, start_dt, day_index, item_index)}@bigears",
+                f"DTSTAMP:{dtstamp}",
                 f"DTSTART:{start_dt.strftime('%Y%m%dT%H%M%S')}",
                 f"DTEND:{end_dt.strftime('%Y%m%dT%H%M%S')}",
-                f"SUMMARY:{name}",
-                f"DESCRIPTION:{notes}",
+                f"SUMMARY:{_ics_text(name)}",
+                f"DESCRIPTION:{_ics_text(notes)}",
                 "END:VEVENT"
             ])
 
     lines.append("END:VCALENDAR")
-    return "\n".join(lines)
+    # RFC 5545 content lines end in CRLF
+    return "\r\n".join(lines) + "\r\n"
@@ -0,0 +1,23 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = "BigEarsAI/1.0 (educational)"
+
+
+def make_session(retries: int = 2, pool_maxsize: int = 16) -> requests.Session:
+    """
+    Keep-alive session with a connection pool and a default User-Agent.
+    `retries` covers connect/read failures with a short backoff; pass 0 where the
+    caller handles ConnectionError itself (e.g. the LLM endpoint fallback).
+    """
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=retries, backoff_factor=0.3) if retries else 0,
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers["User-Agent"] = USER_AGENT
+    return s
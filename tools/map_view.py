@@ -0,0 +1,239 @@
+from typing import NamedTuple
+
+import numpy as np
+import orjson
+import pandas as pd
+import pydeck as pdk
+import streamlit as st
+import streamlit.components.v1 as components
+
+# ============================================================
+# 🗺️ ITINERARY MAP — cached data extraction + Deck build
+# ============================================================
+
+# Kelly's colours of maximum contrast (minus white/black, which vanish on the basemap).
+# Indexed by day number, so a day keeps its colour across reruns.
+_PALETTE = np.array([
+    [243, 195, 0, 180], [135, 86, 146, 180], [243, 132, 0, 180], [161, 202, 241, 180],
+    [190, 0, 50, 180], [194, 178, 128, 180], [132, 132, 130, 180], [0, 136, 86, 180],
+    [230, 143, 172, 180], [0, 103, 165, 180], [249, 133, 121, 180], [96, 78, 151, 180],
+    [246, 166, 0, 180], [179, 68, 108, 180],
+], dtype=np.uint8)
+_NAPOLI_BLUE = [0, 102, 204, 180]
+# Decimals kept in the coordinates sent to deck.gl: ~1 m, about what a float32 holds
+_COORD_DECIMALS = 5
+
+class PlanData(NamedTuple):
+    rows: pd.DataFrame      # itinerary table, one row per item
+    pts: pd.DataFrame       # map points (items with coordinates, or the city centre)
+    lats: np.ndarray
+    lons: np.ndarray
+    days: np.ndarray        # 1-based day number per point; 0 for the city fallback
+
+
+@st.cache_data(ttl=3600, max_entries=8)
+def resolve_trip_location(plan_json: bytes) -> dict:
+    """Where the trip is: city/country for headers, lat/lon for the map fallback."""
+    dest = orjson.loads(plan_json).get("destination") or {}
+    return {
+        "city": dest.get("city"),
+        "country": dest.get("country") or "",
+        "lat": dest.get("lat"),
+        "lon": dest.get("lon"),
+    }
+
+
+@st.cache_data(ttl=3600, max_entries=8)
+def extract_plan_data(plan_json: bytes) -> PlanData:
+    """Walk a serialized plan once, building the itinerary table and the map points.
+
+    Keyed on the plan's JSON bytes, so reruns that don't change the plan
+    (button presses, typing in the refine box) skip the traversal.
+    """
+    plan = orjson.loads(plan_json)
+    # Columnar: one list per table column, built in the same pass as the map points
+    day_labels, times, activities, kinds, notes = [], [], [], [], []
+    lats, lons, names, types, days = [], [], [], [], []
+    for idx, day in enumerate(plan.get("daily_plan", []), start=1):
+        label = f"Day {idx}"
+        for it in day.get("items", []):
+            day_labels.append(label)
+            times.append(it.get("time"))
+            activities.append(it.get("name"))
+            kinds.append(it.get("type"))
+            notes.append(it.get("notes", ""))
+            lats.append(it.get("lat"))
+            lons.append(it.get("lon"))
+            names.append(it.get("name", "Unknown"))
+            types.append(it.get("type", "activity"))
+            days.append(idx)
+
+    # One vectorized pass drops items without usable coordinates (None / junk -> NaN)
+    lats = pd.to_numeric(pd.Series(lats, dtype=object), errors="coerce").to_numpy(np.float64)
+    lons = pd.to_numeric(pd.Series(lons, dtype=object), errors="coerce").to_numpy(np.float64)
+    mask = np.isfinite(lats) & np.isfinite(lons)
+    lats, lons = lats[mask], lons[mask]
+    names = np.array(names, dtype=object)[mask]
+    types = np.array(types, dtype=object)[mask]
+    days = np.array(days, dtype=np.int64)[mask]
+
+    # Fallback if no coordinates
+    if not mask.any():
+        city = resolve_trip_location(plan_json)
+        if city["lat"] and city["lon"]:
+            lats = np.array([city["lat"]], dtype=np.float64)
+            lons = np.array([city["lon"]], dtype=np.float64)
+            names, types = [city["city"] or "Unknown city"], ["city"]
+            days = np.zeros(1, dtype=np.int64)
+
+    pts = pd.DataFrame({
+        "lat": lats.round(_COORD_DECIMALS),
+        "lon": lons.round(_COORD_DECIMALS),
+        "name": names,
+        "type": types,
+        "day": days,
+    })
+    # All text columns: declaring object up front skips pandas' per-column dtype inference
+    rows = pd.DataFrame({
+        "Day": day_labels,
+        "Time": times,
+        "Activity": activities,
+        "Type": kinds,
+        "Notes": notes,
+    }, dtype=object)
+    return PlanData(rows, pts, lats, lons, days)
+
+
+def _build_route_paths(lats, lons, days):
+    """One polyline per day (stops in visiting order) as a frame for the PathLayer."""
+    coords = np.column_stack([lons, lats]).round(_COORD_DECIMALS)
+    splits = np.flatnonzero(days[:-1] != days[1:]) + 1
+    paths = [c.tolist() for c in np.split(coords, splits) if len(c) > 1]
+    return pd.DataFrame({"path": paths})
+
+
+@st.cache_data(max_entries=16)
+def _fit_view(lats, lons, max_zoom=15):
+    """ViewState centred on the points' bounding box, zoomed so they all fit.
+
+    Keyed on the coordinates themselves, so a refine that only touches names,
+    times or notes reuses the previous view.
+    """
+    lat_min, lat_max = float(lats.min()), float(lats.max())
+    lon_min, lon_max = float(lons.min()), float(lons.max())
+    lat_c = (lat_min + lat_max) / 2
+    # Web-mercator: each zoom level halves the visible span; 1.2 leaves a margin
+    span = max(lat_max - lat_min, (lon_max - lon_min) * np.cos(np.radians(lat_c))) * 1.2
+    zoom = min(np.log2(360 / span), max_zoom) if span > 0 else max_zoom
+    return pdk.ViewState(
+        latitude=lat_c,
+        longitude=(lon_min + lon_max) / 2,
+        zoom=float(max(zoom, 1)),
+        pitch=35,
+    )
+
+
+def _day_color(day: int) -> list:
+    # day 0 is the city-centre fallback point
+    return _PALETTE[(day - 1) % len(_PALETTE)].tolist() if day > 0 else _NAPOLI_BLUE
+
+
+_MAP_HEIGHT = 500
+# Above this many stops, stops sharing a ~450 m grid cell are drawn as one marker
+_AGGREGATE_MIN_POINTS = 50
+_GRID_DEG = 0.004
+_STOP_RADIUS = 120
+
+
+def _aggregate_stops(pts: pd.DataFrame, grid_deg: float = _GRID_DEG) -> pd.DataFrame:
+    """Collapse stops on the same grid cell into one marker at their centroid,
+    sized by how many stops it stands for. Keeps the first stop's colour and type."""
+    lats, lons = pts["lat"].to_numpy(), pts["lon"].to_numpy()
+    cells = np.column_stack([np.floor(lats / grid_deg), np.floor(lons / grid_deg)])
+    _, first, inverse, counts = np.unique(cells, axis=0, return_index=True,
+                                          return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    agg = pts.iloc[first].reset_index(drop=True)
+    agg["lat"] = (np.bincount(inverse, weights=lats) / counts).round(_COORD_DECIMALS)
+    agg["lon"] = (np.bincount(inverse, weights=lons) / counts).round(_COORD_DECIMALS)
+    agg["name"] = np.where(counts > 1, [f"{n} stops" for n in counts.tolist()], agg["name"])
+    agg["radius"] = _STOP_RADIUS * np.sqrt(counts)
+    return agg
+
+
+def _build_deck(plan_json: bytes, color_by_day: bool = True):
+    """Build the itinerary Deck; None when there is nothing to plot."""
+    _, pts, lats, lons, days = extract_plan_data(plan_json)
+    if pts.empty:
+        return None
+
+    if color_by_day:
+        day_colors = {d: _day_color(d) for d in np.unique(days).tolist()}
+        pts["color"] = [day_colors[d] for d in days.tolist()]
+    else:
+        pts["color"] = [_NAPOLI_BLUE] * len(pts)
+
+    route = pdk.Layer(
+        "PathLayer",
+        data=_build_route_paths(lats, lons, days),
+        get_path='path',
+        get_color='[0, 51, 102, 140]',  # deep navy, under the stops
+        get_width=3,
+        width_units='pixels',
+    )
+
+    # Dense trips: fewer, larger markers instead of stacks of overlapping ones
+    if len(pts) >= _AGGREGATE_MIN_POINTS:
+        stops, radius = _aggregate_stops(pts), 'radius'
+    else:
+        # A place visited twice (the hotel on several days) is one marker, not a stack;
+        # pts is already rounded, so near-identical coordinates collapse too
+        stops, radius = pts.drop_duplicates(["lat", "lon"]), _STOP_RADIUS
+
+    # pydeck under Streamlit always serializes rows to JSON, so ship only the columns
+    # the accessors and tooltip read
+    cols = ["lon", "lat", "name", "type", "color"] + (["radius"] if radius == 'radius' else [])
+    scatter = pdk.Layer(
+        "ScatterplotLayer",
+        data=stops[cols],
+        get_position='[lon, lat]',
+        get_fill_color='color',
+        get_radius=radius,
+        pickable=True
+    )
+
+    view_state = _fit_view(lats, lons)
+
+    return pdk.Deck(
+        layers=[route, scatter],
+        initial_view_state=view_state,
+        tooltip={"text": "{name}\nType: {type}"}
+    )
+
+
+@st.cache_data(max_entries=8)
+def _deck_html(plan_json: bytes, color_by_day: bool = True) -> str | None:
+    """Standalone deck.gl page for the plan, serialized once per plan."""
+    deck = _build_deck(plan_json, color_by_day)
+    return deck.to_html(as_string=True) if deck is not None else None
+
+
+def render_itinerary_map(plan: dict, plan_json: bytes | None = None, *, color_by_day: bool = True) -> bool:
+    """
+    Render the itinerary map for `plan`.
+    `plan_json` is the plan's serialized form (e.g. TripState.plan_bytes) and is used
+    as the cache key; it is computed if omitted. With `color_by_day` each day's stops
+    get their own palette colour, otherwise all stops are Napoli blue.
+    Returns False if there was nothing to plot.
+    """
+    try:
+        html = _deck_html(plan_json or orjson.dumps(plan), color_by_day)
+        if html is None:
+            st.info("No map data available.")
+            return False
+        # A static component: the canvas lives client-side and reruns resend only
+        # the cached page, not a freshly re-serialized Deck
+        components.html(html, height=_MAP_HEIGHT)
+    except Exception as e:
+        st.error(f"Map failed to render: {e}")
+    return True
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 def osm_deeplink(lat, lon, zoom=15):
     return f"https://www.openstreetmap.org/#map={zoom}/{lat}/{lon}"
@@ -12,6 +13,15 @@ def haversine_km(lat1, lon1, lat2, lon2):
     c = 2*math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
+def haversine_km_np(lat1, lon1, lat2, lon2):
+    # Element-wise haversine over aligned arrays; NaN coordinates give NaN distances
+    R = 6371.0
+    phi1 = np.radians(lat1); phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dl = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dl/2)**2
+    return 2*R*np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
 def bbox_from_points(points):
     lats = [p[0] for p in points]
     lons = [p[1] for p in points]
@@ -0,0 +1,18 @@
+import math
+
+# Numba-compiled haversine for the scalar hop-trim loop in agent/graph.py.
+# cache=True persists the machine code next to this file, so only the first run pays
+# for JIT compilation. Without numba installed this is the plain tools.maps version.
+try:
+    from numba import njit
+except ImportError:
+    from tools.maps import haversine_km
+else:
+    @njit(cache=True, fastmath=True)
+    def haversine_km(lat1, lon1, lat2, lon2):
+        R = 6371.0
+        phi1 = math.radians(lat1); phi2 = math.radians(lat2)
+        dphi = math.radians(lat2 - lat1)
+        dl = math.radians(lon2 - lon1)
+        a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
+        return 2*R*math.asin(math.sqrt(min(a, 1.0)))
@@ -0,0 +1,64 @@
+import orjson
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJsonParser:
+    """
+    Best-effort parser for a JSON document that arrives in pieces (e.g. streamed
+    LLM tokens). The scanner state is kept between calls, so each feed() only walks
+    the new text.
+
+    A "safe point" is the position right after a `{`, `[`, `}` or `]` outside a
+    string: cutting the text there and appending the closers still open at that
+    point always yields well-formed JSON. feed() returns that completion, parsed,
+    whenever the safe point has moved; otherwise None.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._begin = None
+        self._safe_end = 0
+        self._safe_closers = ""
+
+    def feed(self, delta: str):
+        start = len(self.text)
+        self.text += delta
+        moved = False
+        stack = self._stack
+        for i in range(start, len(self.text)):
+            ch = self.text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._begin is None:
+                    # Skip any prose the model put before the document
+                    self._begin = i
+                stack.append(_CLOSERS[ch])
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+            else:
+                continue
+            if ch != '"':
+                self._safe_end = i + 1
+                self._safe_closers = "".join(reversed(stack))
+                moved = True
+        if not moved:
+            return None
+        try:
+            return orjson.loads(self.text[self._begin:self._safe_end] + self._safe_closers)
+        except orjson.JSONDecodeError:
+            # Malformed so far (e.g. a missing comma); a later safe point may recover
+            return None
@@ -0,0 +1,48 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Idle plans expire, and the least recently used go first once the store is full,
+# so abandoned sessions don't pin their plans until the process restarts
+_PLAN_TTL_S = 2 * 3600
+_PLAN_STORE_MAX = 256
+
+
+class PlanStore:
+    """Thread-safe LRU of (plan, plan_bytes) by id; reading an entry renews its TTL."""
+
+    def __init__(self, ttl_s=_PLAN_TTL_S, max_entries=_PLAN_STORE_MAX):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, plan_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(plan_id)
+            if entry is None:
+                return None
+            expires, plan, plan_bytes = entry
+            if expires <= now:
+                del self._entries[plan_id]
+                return None
+            self._entries[plan_id] = (now + self.ttl_s, plan, plan_bytes)
+            self._entries.move_to_end(plan_id)
+            return plan, plan_bytes
+
+    def put(self, plan_id, plan, plan_bytes):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[plan_id] = (now + self.ttl_s, plan, plan_bytes)
+            self._entries.move_to_end(plan_id)
+            # Oldest first: drop what has expired, then whatever is over the cap
+            while self._entries:
+                oldest, (expires, _, _) = next(iter(self._entries.items()))
+                if expires > now and len(self._entries) <= self.max_entries:
+                    break
+                del self._entries[oldest]
+
+    def pop(self, plan_id):
+        with self._lock:
+            self._entries.pop(plan_id, None)
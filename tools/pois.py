@@ -1,54 +1,37 @@
-'''
-import os, requests, math
+import math, threading, time
+import orjson
+from tools.http_session import make_session
 
-def find_city_center(query: str):
-    # Use Nominatim (OSM) for geocoding (courteous usage: light traffic)
-    try:
-        r = requests.get("https://nominatim.openstreetmap.org/search",
-                         params={"q": query, "format":"json", "limit": 1}, timeout=20,
-                         headers={"User-Agent":"TripSmith/0.1 (educational)"})
-        r.raise_for_status()
-        arr = r.json()
-        if not arr: return None
-        hit = arr[0]
-        return {"city": hit.get("display_name","").split(",")[0],
-                "country": "", "lat": float(hit["lat"]), "lon": float(hit["lon"])}
-    except Exception:
-        return None
+# Shared session: keep-alive connections to Nominatim / Overpass across calls
+_SESSION = make_session()
 
-def get_pois_nearby(lat, lon, radius=3000, kinds="interesting_places,foods", limit=40):
-    key = os.getenv("OPENTRIPMAP_API_KEY")
-    if not key:
-        # fallback: return empty list; the agent can still plan
-        return []
-    r = requests.get("https://api.opentripmap.com/0.1/en/places/radius",
-                     params={"apikey": key, "radius": radius, "lon": lon, "lat": lat,
-                             "kinds": kinds, "limit": limit},
-                     timeout=30)
-    r.raise_for_status()
-    feats = r.json().get("features", [])
-    pois = []
-    for f in feats:
-        props = f.get("properties", {})
-        geom = f.get("geometry",{})
-        coords = geom.get("coordinates",[None,None])
-        pois.append({"name": props.get("name","POI"),
-                     "lat": coords[1], "lon": coords[0],
-                     "rate": props.get("rate")})
-    return pois'''
-import os, requests, math
+# Nominatim's usage policy: at most one request per second, no parallel bulk
+# geocoding. Every search in the process goes through this lock, one at a time.
+_NOMINATIM_INTERVAL_S = 1.0
+_NOMINATIM_LOCK = threading.Lock()
+_nominatim_last = 0.0
+
+def _nominatim_search(params):
+    global _nominatim_last
+    with _NOMINATIM_LOCK:
+        wait = _nominatim_last + _NOMINATIM_INTERVAL_S - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            return _SESSION.get(
+                "https://nominatim.openstreetmap.org/search",
+                params=params,
+                timeout=20,
+            )
+        finally:
+            _nominatim_last = time.monotonic()
 
 def find_city_center(query: str):
-    # Use Nominatim (OSM) for geocoding (courteous usage: light traffic)
+    # Use Nominatim (OSM) for geocoding (courteous usage: rate-limited, see above)
     try:
-        r = requests.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={"q": query, "format": "json", "limit": 1},
-            timeout=20,
-            headers={"User-Agent": "BigEarsAI/1.0 (educational)"}
-        )
+        r = _nominatim_search({"q": query, "format": "json", "limit": 1})
         r.raise_for_status()
-        arr = r.json()
+        arr = orjson.loads(r.content)
         if not arr:
             return None
         hit = arr[0]
@@ -68,28 +51,30 @@ def get_pois_nearby(lat, lon, radius=3000, kinds="interesting_places,foods", lim
     This is a fallback when no OPENTRIPMAP_API_KEY is available.
     """
     try:
-        # Overpass API query to fetch restaurants, cafes, bars, museums, parks, and attractions
+        # Overpass API query to fetch restaurants, cafes, bars, museums, parks, and attractions.
+        # One global bbox (cheaper to index than per-clause around:) covering the radius,
+        # the amenities folded into one regex clause, and unnamed nodes (which we drop
+        # anyway) filtered server-side so `limit` counts only usable POIs.
+        dlat = radius / 111_320
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        bbox = f"{lat - dlat},{lon - dlon},{lat + dlat},{lon + dlon}"
         query = f"""
-        [out:json][timeout:25];
+        [out:json][timeout:25][bbox:{bbox}];
         (
-          node["tourism"](around:{radius},{lat},{lon});
-          node["amenity"="restaurant"](around:{radius},{lat},{lon});
-          node["amenity"="cafe"](around:{radius},{lat},{lon});
-          node["amenity"="bar"](around:{radius},{lat},{lon});
-          node["amenity"="museum"](around:{radius},{lat},{lon});
-          node["leisure"="park"](around:{radius},{lat},{lon});
+          node["tourism"]["name"];
+          node["amenity"~"^(restaurant|cafe|bar|museum)$"]["name"];
+          node["leisure"="park"]["name"];
         );
         out center {limit};
         """
 
-        r = requests.post(
+        r = _SESSION.post(
             "https://overpass-api.de/api/interpreter",
             data={"data": query},
             timeout=30,
-            headers={"User-Agent": "BigEarsAI/1.0"},
         )
         r.raise_for_status()
-        data = r.json()
+        data = orjson.loads(r.content)
 
         pois = []
         for el in data.get("elements", []):
@@ -0,0 +1,42 @@
+import math
+
+import pandas as pd
+import streamlit as st
+
+# ============================================================
+# 📅 ITINERARY TABLE — paginated st.dataframe
+# ============================================================
+
+PAGE_ROWS = 50
+
+# Declared up front so Streamlit doesn't infer a type per column on every render
+_COLUMN_CONFIG = {
+    "Day": st.column_config.TextColumn("Day", width="small"),
+    "Time": st.column_config.TextColumn("Time", width="small"),
+    "Activity": st.column_config.TextColumn("Activity"),
+    "Type": st.column_config.TextColumn("Type", width="small"),
+    "Notes": st.column_config.TextColumn("Notes"),
+}
+
+
+@st.fragment
+def render_itinerary_table(rows: pd.DataFrame, *, key: str, page_rows: int = PAGE_ROWS) -> None:
+    """
+    Show the itinerary table (as built by map_view.extract_plan_data).
+    Long trips are split into pages of `page_rows`, so only one page is serialized
+    and sent to the browser per render. Runs as a fragment: turning the page reruns
+    only the table, not the map or the rest of the app.
+    """
+    if rows.empty:
+        st.info("No activities found in your itinerary.")
+        return
+
+    pages = math.ceil(len(rows) / page_rows)
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages,
+                               value=1, step=1, key=f"{key}_page")
+        start = (page - 1) * page_rows
+        rows = rows.iloc[start:start + page_rows]
+
+    st.dataframe(rows, use_container_width=True, height=420,
+                 column_config=_COLUMN_CONFIG, key=key)
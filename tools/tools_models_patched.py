@@ -1,4 +1,8 @@
-import os, requests
+import os
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from tools.http_session import make_session
 
 # Flexible client that works with either:
 # 1) OpenAI-compatible servers (LM Studio, vLLM, TGI) -> /v1/chat/completions
@@ -7,19 +11,32 @@ BASE = os.getenv("OPENAI_BASE", "http://localhost:11434").rstrip("/")  # e.g., h
 MODEL = os.getenv("OPENAI_MODEL", "mistral")
 API_KEY = os.getenv("OPENAI_API_KEY", "")
 
-def _try_openai(messages, temperature=0.4, base=None):
+# Shared session so repeated chat/health calls reuse one keep-alive connection
+_SESSION = make_session(retries=0)
+# Bodies are encoded with orjson and sent as data=, so requests' json.dumps is skipped
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_OPENAI_HEADERS = {**_JSON_HEADERS, "Authorization": f"Bearer {API_KEY}"}
+
+# Cap on model requests in flight across the whole process (e.g. several Streamlit
+# sessions at once), blocking and streaming alike; further calls wait for a slot.
+# With OLLAMA_NUM_PARALLEL >= this, the server decodes them in the same forward passes.
+MAX_INFLIGHT = int(os.getenv("LLM_MAX_BATCH", "8"))
+_SLOTS = threading.BoundedSemaphore(MAX_INFLIGHT)
+
+def _try_openai(messages, temperature=0.4, base=None, max_tokens=None):
     base = base or BASE
     payload = {"model": MODEL, "messages": messages, "temperature": temperature}
-    r = requests.post(f"{base}/v1/chat/completions",
-                      headers={"Authorization": f"Bearer {API_KEY}"},
-                      json=payload, timeout=120)
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    r = _SESSION.post(f"{base}/v1/chat/completions", headers=_OPENAI_HEADERS,
+                      data=orjson.dumps(payload), timeout=120)
     # If server exists but doesn't support /v1, force fallback
     if r.status_code in (404, 400):
         raise RuntimeError("OpenAI route unsupported, fallback to Ollama native")
     r.raise_for_status()
-    return r.json()
+    return orjson.loads(r.content)
 
-def _try_ollama(messages, temperature=0.4, base=None):
+def _try_ollama(messages, temperature=0.4, base=None, max_tokens=None):
     base = base or BASE
     payload = {
         "model": MODEL,
@@ -27,50 +44,121 @@ def _try_ollama(messages, temperature=0.4, base=None):
         "stream": False,
         "options": {"temperature": temperature}
     }
-    r = requests.post(f"{base}/api/chat", json=payload, timeout=120)
+    if max_tokens is not None:
+        payload["options"]["num_predict"] = max_tokens
+    r = _SESSION.post(f"{base}/api/chat", headers=_JSON_HEADERS,
+                      data=orjson.dumps(payload), timeout=120)
     r.raise_for_status()
-    data = r.json()
+    data = orjson.loads(r.content)
     content = (data.get("message") or {}).get("content", "")
     return {"choices":[{"message":{"content": content}}]}
 
-def chat_complete(messages, temperature=0.4):
+# Route that answered last ("openai" or "ollama"). Tried first on later calls, so a
+# native-only Ollama doesn't cost a refused /v1 attempt per request.
+_ENDPOINT_PREF = None
+
+def _routes(openai_fn, ollama_fn):
+    routes = [("openai", openai_fn), ("ollama", ollama_fn)]
+    return routes[::-1] if _ENDPOINT_PREF == "ollama" else routes
+
+def chat_complete(messages, temperature=0.4, max_tokens=None):
     """
     Try /v1 first; if connection refused or unsupported, fall back to Ollama native API.
+    Once a route has answered it is tried first next time, and the other one is only
+    the fallback. `max_tokens` caps generation (mapped to `num_predict` on the native API).
     """
-    try:
-        return _try_openai(messages, temperature=temperature)
-    except requests.exceptions.ConnectionError:
-        # nothing listening on /v1 -> try Ollama native
-        return _try_ollama(messages, temperature=temperature)
-    except Exception:
-        # other errors -> attempt native before raising
+    global _ENDPOINT_PREF
+    (first, first_fn), (second, second_fn) = _routes(_try_openai, _try_ollama)
+    with _SLOTS:
+        try:
+            result = first_fn(messages, temperature=temperature, max_tokens=max_tokens)
+            _ENDPOINT_PREF = first
+        except Exception:
+            # refused, unsupported or failing -> attempt the other route before raising
+            result = second_fn(messages, temperature=temperature, max_tokens=max_tokens)
+            _ENDPOINT_PREF = second
+    return result
+
+def _stream_openai(messages, temperature=0.4, base=None):
+    base = base or BASE
+    payload = {"model": MODEL, "messages": messages, "temperature": temperature, "stream": True}
+    with _SESSION.post(f"{base}/v1/chat/completions", headers=_OPENAI_HEADERS,
+                       data=orjson.dumps(payload), timeout=120, stream=True) as r:
+        if r.status_code in (404, 400):
+            raise RuntimeError("OpenAI route unsupported, fallback to Ollama native")
+        r.raise_for_status()
+        # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+        for line in r.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            choices = orjson.loads(data).get("choices") or [{}]
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
+def _stream_ollama(messages, temperature=0.4, base=None):
+    base = base or BASE
+    payload = {
+        "model": MODEL,
+        "messages": messages,
+        "stream": True,
+        "options": {"temperature": temperature}
+    }
+    with _SESSION.post(f"{base}/api/chat", headers=_JSON_HEADERS,
+                       data=orjson.dumps(payload), timeout=120, stream=True) as r:
+        r.raise_for_status()
+        # One JSON object per line; the last one has "done": true
+        for line in r.iter_lines():
+            if not line:
+                continue
+            chunk = orjson.loads(line)
+            content = (chunk.get("message") or {}).get("content")
+            if content:
+                yield content
+            if chunk.get("done"):
+                break
+
+def chat_complete_stream(messages, temperature=0.4):
+    """
+    Streaming counterpart of chat_complete: yields content fragments as they arrive.
+    Same route order; falls back to the other route only if the first fails before
+    producing any output. Holds one of the MAX_INFLIGHT slots until the stream is
+    exhausted or closed.
+    """
+    global _ENDPOINT_PREF
+    (first, first_fn), (second, second_fn) = _routes(_stream_openai, _stream_ollama)
+    started = False
+    with _SLOTS:
         try:
-            return _try_ollama(messages, temperature=temperature)
+            for content in first_fn(messages, temperature=temperature):
+                started = True
+                yield content
+            _ENDPOINT_PREF = first
         except Exception:
-            raise
+            if started:
+                raise
+            yield from second_fn(messages, temperature=temperature)
+            _ENDPOINT_PREF = second
+
+def _probe(url):
+    try:
+        return _SESSION.get(url, timeout=3).ok
+    except Exception:
+        return False
 
 def healthcheck():
     """
     Returns a dict indicating which endpoints are reachable.
     Example:
         {"openai_v1": True, "ollama_native": False, "base": "...", "model": "..."}
+    Both endpoints are probed concurrently with body-less GETs.
     """
-    ok_openai = False
-    ok_native = False
-    try:
-        # minimal POST to /v1
-        import json as _json
-        _ = requests.post(f"{BASE}/v1/chat/completions",
-                          json={"model": MODEL, "messages":[{"role":"user","content":"hi"}]},
-                          timeout=3)
-        ok_openai = True
-    except Exception:
-        ok_openai = False
-    try:
-        # GET tags on Ollama
-        r = requests.get(f"{BASE}/api/tags", timeout=3)
-        r.raise_for_status()
-        ok_native = True
-    except Exception:
-        ok_native = False
-    return {"openai_v1": ok_openai, "ollama_native": ok_native, "base": BASE, "model": MODEL}
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        # /v1/models lists models on OpenAI-compatible servers; /api/tags on Ollama
+        ok_openai = ex.submit(_probe, f"{BASE}/v1/models")
+        ok_native = ex.submit(_probe, f"{BASE}/api/tags")
+        return {"openai_v1": ok_openai.result(), "ollama_native": ok_native.result(),
+                "base": BASE, "model": MODEL}
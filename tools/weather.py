@@ -1,4 +1,9 @@
-import requests, datetime as dt
+import datetime as dt
+import orjson
+from tools.http_session import make_session
+
+# Shared session: keep-alive connection to Open-Meteo across calls
+_SESSION = make_session()
 
 def get_weather_daily(lat, lon, start_iso, end_iso, timezone="auto"):
     url = "https://api.open-meteo.com/v1/forecast"
@@ -7,9 +12,9 @@ def get_weather_daily(lat, lon, start_iso, end_iso, timezone="auto"):
         "daily": "weathercode,temperature_2m_max,temperature_2m_min,precipitation_probability_max",
         "timezone": timezone, "start_date": start_iso, "end_date": end_iso
     }
-    r = requests.get(url, params=params, timeout=30)
+    r = _SESSION.get(url, params=params, timeout=30)
     r.raise_for_status()
-    return r.json()
+    return orjson.loads(r.content)
 
 def get_weather_daily_by_city(city, lat, lon, start_iso, end_iso):
     if not (start_iso and end_iso):
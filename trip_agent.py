@@ -1,20 +1,187 @@
-import requests
-import json
-from datetime import datetime, timedelta
+import os
+import copy
+import functools
+import hashlib
+import orjson
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+import threading
+import time
+from collections import OrderedDict
+import diskcache
+from tools.http_session import make_session
+from tools.partial_json import IncrementalJsonParser
+from tools.pois import find_city_center
 
 OLLAMA_URL = "http://localhost:11434/api/chat"
 MODEL = "mistral:latest"
 
+# One keep-alive session per process, shared by every agent call
+_SESSION = make_session(retries=0)
+
+# Parsed plans by exact prompt, shared with agent/graph's cache directory.
+# The prompt is built from every intent field, so it doubles as the canonical key.
+# Geocoded places live here too, keyed on (city, name).
+_PLAN_CACHE = diskcache.Cache(os.path.expanduser(os.getenv("BIGEARS_CACHE_DIR", "~/.bigears_cache")))
+_PLAN_TTL = 24 * 3600
+_GEOCODE_TTL = 7 * 24 * 3600
+
+# In-process LRU in front of the disk cache, keyed on the intent itself, so a repeat
+# call skips building the prompt and the disk read. Entries expire with the disk
+# entry they mirror.
+_INTENT_CACHE = OrderedDict()
+_INTENT_CACHE_SIZE = 512
+_INTENT_LOCK = threading.Lock()
+
 class TripState:
     def __init__(self):
         self.intent = {}
         self.plan = {}
         self.messages = []
+        self.plan_arrays = None
 
-        
-def run_agent_once(state):
-    intent = state.intent
 
+class Item:
+    __slots__ = ("time", "name", "type", "notes", "lat", "lon")
+
+    def __init__(self, time, name, type, notes, lat, lon):
+        self.time, self.name, self.type, self.notes = time, name, type, notes
+        self.lat, self.lon = lat, lon
+
+
+class Day:
+    __slots__ = ("date", "items")
+
+    def __init__(self, date, items):
+        self.date, self.items = date, items
+
+
+def _plan_to_records(plan):
+    """
+    The plan's days as Day/Item records: the dict lookups (and their defaults) are
+    paid once here, and the exporters read plain attributes.
+    """
+    return [
+        Day(day["date"], [
+            Item(item.get("time", ""), item.get("name", ""), item.get("type", ""),
+                 item.get("notes", ""), item.get("lat"), item.get("lon"))
+            for item in day.get("items") or ()
+        ])
+        for day in plan.get("daily_plan") or ()
+    ]
+
+
+class PlanArrays(NamedTuple):
+    """Column (SoA) view of a plan's items, in plan order, for numpy-side analytics."""
+    lats: np.ndarray        # float64, NaN where an item has no coordinates
+    lons: np.ndarray
+    days: np.ndarray        # 0-based day index per item
+    time_codes: np.ndarray  # index into _TIME_SLOTS, -1 for anything else
+    type_ids: np.ndarray    # index into types
+    types: np.ndarray       # sorted unique item types
+
+
+_TIME_SLOTS = ("morning", "afternoon", "evening")
+_TIME_CODES = {slot: code for code, slot in enumerate(_TIME_SLOTS)}
+
+def _coord(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _plan_arrays(plan):
+    # Walks the raw dicts rather than _plan_to_records: a plan that parses but bends
+    # the schema (days without a date, non-dict entries, odd field types) still gets
+    # arrays, with NaN/-1/"" standing in for what it lacks
+    days = plan.get("daily_plan")
+    items = [
+        (d, item)
+        for d, day in enumerate(days if isinstance(days, list) else ())
+        if isinstance(day, dict) and isinstance(day.get("items"), list)
+        for item in day["items"]
+        if isinstance(item, dict)
+    ]
+    n = len(items)
+    kinds = [item.get("type") for _, item in items]
+    types, type_ids = np.unique(np.array([k if isinstance(k, str) else "" for k in kinds], dtype=str),
+                                return_inverse=True)
+    times = [item.get("time") for _, item in items]
+    return PlanArrays(
+        lats=np.fromiter((_coord(item.get("lat")) for _, item in items), dtype=np.float64, count=n),
+        lons=np.fromiter((_coord(item.get("lon")) for _, item in items), dtype=np.float64, count=n),
+        days=np.fromiter((d for d, _ in items), dtype=np.int32, count=n),
+        time_codes=np.fromiter((_TIME_CODES.get(t, -1) if isinstance(t, str) else -1 for t in times),
+                               dtype=np.int8, count=n),
+        type_ids=type_ids.astype(np.int32),
+        types=types,
+    )
+
+
+def _set_plan(state, plan):
+    # Every final plan also gets its column view; the exporters keep using the dicts
+    state.plan = plan
+    state.plan_arrays = _plan_arrays(plan)
+
+
+# Built once at import. The invariant part (role + JSON structure) comes first so
+# every call shares the longest possible prefix and Ollama can reuse its KV cache;
+# only the trip fields at the end differ between calls.
+# The structure example is serialised without whitespace: indentation only costs
+# prompt tokens and carries nothing the model needs.
+_PLAN_SCHEMA = orjson.dumps({
+    "destination": {"city": "...", "country": "..."},
+    "daily_plan": [
+        {
+            "date": "...",
+            "items": [
+                {"time": "morning", "name": "...", "type": "...", "notes": "..."},
+                {"time": "afternoon", "name": "...", "type": "...", "notes": "..."},
+            ],
+        }
+    ],
+}).decode()
+_PROMPT_PREFIX = (
+    "You are Big Ears, a world-class AI travel planner.\n"
+    f"Please respond in JSON only, with this exact structure: {_PLAN_SCHEMA}\n"
+    "Now plan the following trip.\n"
+)
+_TRIP_TEMPLATE = (
+    "Plan a detailed {days}-day trip starting from {origin} to {dest}.\n"
+    "The user prefers these vibes: {vibe}.\n"
+    "Budget: £{budget}.\n"
+    "Start date: {start}.\n"
+    "Description: {description}.\n"
+)
+
+# Keep the model loaded between calls so the cached prefix survives
+_KEEP_ALIVE = "30m"
+
+# Decoding options. num_ctx is fixed (sized for the longest plans) because changing
+# it between calls makes Ollama reload the model.
+_NUM_CTX = 4096
+# Nothing useful follows the closing brace; stop there instead of letting the model
+# pad or explain
+_STOP = ["\n\n\n", "```"]
+
+def _options(days):
+    """Ollama options for a `days`-day plan: output is budgeted per day."""
+    return {
+        "num_predict": 200 + 150 * int(days),
+        "temperature": 0.4,
+        "top_p": 0.9,
+        "num_ctx": _NUM_CTX,
+        "stop": _STOP,
+    }
+
+# run_many's cap on requests in flight; with OLLAMA_NUM_PARALLEL > 1 the server
+# decodes them in the same forward passes
+_MAX_PARALLEL = int(os.getenv("LLM_MAX_BATCH", "8"))
+
+def _build_prompt(intent):
+    """The planner prompt for `intent`, plus the dest/days the fallback plan needs."""
     origin = intent.get("origin", "Unknown")
     dest = intent.get("dest", "")
     start = intent.get("start", str(datetime.today().date()))
@@ -23,82 +190,297 @@ def run_agent_once(state):
     vibe = intent.get("vibe", [])
     description = intent.get("description", "")
 
-    prompt = f"""
-    You are Big Ears, a world-class AI travel planner.
+    prompt = _PROMPT_PREFIX + _TRIP_TEMPLATE.format_map({
+        "days": days,
+        "origin": origin,
+        "dest": dest or "a recommended destination",
+        "vibe": ", ".join(vibe),
+        "budget": budget,
+        "start": start,
+        "description": description,
+    })
+    return prompt, dest, days
+
+
+_FALLBACK_ITEMS = (
+    {"time": "morning", "name": "Sightseeing", "type": "Explore", "notes": "Discover local highlights"},
+    {"time": "afternoon", "name": "Local Food Experience", "type": "Food", "notes": "Try authentic cuisine"},
+)
 
-    Plan a detailed {days}-day trip starting from {origin} to {dest if dest else 'a recommended destination'}.
-    The user prefers these vibes: {', '.join(vibe)}.
-    Budget: £{budget}.
-    Start date: {start}.
-    Description: {description}.
 
-    Please respond in JSON only, with this exact structure:
-    {{
-        "destination": {{"city": "...", "country": "..."}},
+def _fallback_plan(dest, days):
+    # used when the model returns messy text
+    today = datetime.today().date()
+    return {
+        "destination": {"city": dest or "Unknown", "country": "Unknown"},
         "daily_plan": [
-            {{
-                "date": "...",
-                "items": [
-                    {{"time": "morning", "name": "...", "type": "...", "notes": "...", "lat": 0.0, "lon": 0.0}},
-                    {{"time": "afternoon", "name": "...", "type": "...", "notes": "...", "lat": 0.0, "lon": 0.0}}
-                ]
-            }}
+            {
+                "date": str(today + timedelta(days=i)),
+                "items": [item.copy() for item in _FALLBACK_ITEMS]
+            }
+            for i in range(days)
         ]
-    }}
+    }
+
+
+@functools.lru_cache(maxsize=4096)
+def _geocode_memo(name, city):
+    key = ("trip_agent_geocode", city, name)
+    coords = _PLAN_CACHE.get(key)
+    if coords is None:
+        hit = find_city_center(f"{name}, {city}")
+        if hit is None:
+            # Not memoized: the lookup may have failed transiently
+            raise LookupError(name)
+        coords = (hit["lat"], hit["lon"])
+        _PLAN_CACHE.set(key, coords, expire=_GEOCODE_TTL)
+    return coords
+
+def _geocode_place(name, city):
+    try:
+        return _geocode_memo(name, city)
+    except LookupError:
+        return None
+
+
+def _fill_coords(plan, dest):
+    """
+    Give every item lat/lon from Nominatim instead of asking the model for them.
+    Each unique place is looked up once; cache hits are served concurrently, while
+    actual Nominatim requests queue behind find_city_center's rate limit. Items
+    that can't be found are left without coordinates.
     """
+    destination = plan.get("destination")
+    city = (destination.get("city") if isinstance(destination, dict) else None) or dest
+    missing = [
+        item
+        for day in plan.get("daily_plan") or ()
+        if isinstance(day, dict)
+        for item in day.get("items") or ()
+        if isinstance(item, dict) and isinstance(item.get("name"), str) and item["name"]
+        and (item.get("lat") is None or item.get("lon") is None)
+    ]
+    names = list(dict.fromkeys(item["name"] for item in missing))
+    if not names:
+        return plan
+    with ThreadPoolExecutor(max_workers=min(8, len(names))) as pool:
+        found = dict(zip(names, pool.map(_geocode_place, names, [city] * len(names))))
+    for item in missing:
+        coords = found[item["name"]]
+        if coords is not None:
+            item["lat"], item["lon"] = coords
+    return plan
+
+
+def _intent_key(intent):
+    if "start" not in intent:
+        # The prompt defaults the start date to today, so the key must too
+        intent = {**intent, "start": str(datetime.today().date())}
+    return hashlib.blake2b(orjson.dumps(intent, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+
+def _remembered(key):
+    with _INTENT_LOCK:
+        entry = _INTENT_CACHE.get(key)
+        if entry is None:
+            return None
+        expires, plan = entry
+        if expires <= time.time():
+            del _INTENT_CACHE[key]
+            return None
+        _INTENT_CACHE.move_to_end(key)
+    # Callers own (and may mutate) state.plan, so never hand out the memoized object
+    return copy.deepcopy(plan)
+
+def _remember(key, plan, expires=None):
+    """Memoize `plan` until `expires` (epoch seconds; default: _PLAN_TTL from now)."""
+    if expires is None:
+        expires = time.time() + _PLAN_TTL
+    plan = copy.deepcopy(plan)
+    with _INTENT_LOCK:
+        _INTENT_CACHE[key] = (expires, plan)
+        _INTENT_CACHE.move_to_end(key)
+        if len(_INTENT_CACHE) > _INTENT_CACHE_SIZE:
+            _INTENT_CACHE.popitem(last=False)
+
+
+def _parse_reply(text):
+    """The model's reply as a plan dict; None unless it is a JSON object."""
+    try:
+        # A null content (no reply at all) parses like an empty one
+        plan = orjson.loads((text or "").strip())
+    except orjson.JSONDecodeError:
+        return None
+    # Valid JSON can still be an array or a scalar
+    return plan if isinstance(plan, dict) else None
+
+
+def run_agent_once(state):
+    intent_key = _intent_key(state.intent)
+    remembered = _remembered(intent_key)
+    if remembered is not None:
+        _set_plan(state, remembered)
+        return state
+
+    prompt, dest, days = _build_prompt(state.intent)
 
     payload = {
         "model": MODEL,
         "messages": [{"role": "user", "content": prompt}],
-        "stream": False
+        "stream": False,
+        "keep_alive": _KEEP_ALIVE,
+        # Constrained decoding: the reply is always a bare JSON document
+        "format": "json",
+        "options": _options(days),
     }
 
+    cache_key = ("trip_agent_plan", prompt)
+    cached, expires = _PLAN_CACHE.get(cache_key, expire_time=True)
+    if cached is not None:
+        _remember(intent_key, cached, expires)
+        _set_plan(state, cached)
+        return state
+
+    response = _SESSION.post(OLLAMA_URL, json=payload, timeout=(5, 120))
     try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        data = response.json()
-        ai_text = data.get("message", {}).get("content", "").strip()
-
-        # Try parsing JSON output from model
-        plan = json.loads(ai_text)
-        state.plan = plan
-
-    except json.JSONDecodeError:
-        # fallback if model returns messy text
-        state.plan = {
-            "destination": {"city": dest or "Unknown", "country": "Unknown"},
-            "daily_plan": [
-                {
-                    "date": str(datetime.today().date() + timedelta(days=i)),
-                    "items": [
-                        {"time": "morning", "name": "Sightseeing", "type": "Explore", "notes": "Discover local highlights"},
-                        {"time": "afternoon", "name": "Local Food Experience", "type": "Food", "notes": "Try authentic cuisine"}
-                    ]
-                }
-                for i in range(days)
-            ]
-        }
+        data = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        data = {}
+    plan = _parse_reply((data.get("message") or {}).get("content", ""))
 
+    if plan is None:
+        # format=json makes this rare (e.g. a reply cut off at num_predict)
+        print("❗ Using fallback plan.")
+        _set_plan(state, _fallback_plan(dest, days))
+        return state
+
+    plan = _fill_coords(plan, dest)
+    _set_plan(state, plan)
+    # Only real model output is cached, never the fallback above
+    _PLAN_CACHE.set(cache_key, plan, expire=_PLAN_TTL)
+    _remember(intent_key, plan)
     return state
-def itinerary_to_markdown(plan):
+
+
+def run_many(states):
+    """
+    run_agent_once for several intents at once (e.g. comparing destinations or budget
+    tiers), over the shared session. Returns the states in input order.
+    """
+    if not states:
+        return []
+    with ThreadPoolExecutor(max_workers=min(_MAX_PARALLEL, len(states))) as pool:
+        return list(pool.map(run_agent_once, states))
+
+
+def run_agent_stream(state):
+    """
+    Streaming variant of run_agent_once: yields best-effort partial plans while the
+    model is still writing, then the final plan, which is also left in state.plan.
+    """
+    intent_key = _intent_key(state.intent)
+    remembered = _remembered(intent_key)
+    if remembered is not None:
+        _set_plan(state, remembered)
+        yield remembered
+        return
+
+    prompt, dest, days = _build_prompt(state.intent)
+
+    cache_key = ("trip_agent_plan", prompt)
+    cached, expires = _PLAN_CACHE.get(cache_key, expire_time=True)
+    if cached is not None:
+        _remember(intent_key, cached, expires)
+        _set_plan(state, cached)
+        yield cached
+        return
+
+    payload = {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+        "keep_alive": _KEEP_ALIVE,
+        "format": "json",
+        "options": _options(days),
+    }
+    parser = IncrementalJsonParser()
+    with _SESSION.post(OLLAMA_URL, json=payload, timeout=(5, 120), stream=True) as response:
+        # One JSON object per line; the last one has "done": true
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = orjson.loads(line)
+            partial = parser.feed((chunk.get("message") or {}).get("content", ""))
+            if isinstance(partial, dict):
+                # Arrays are rebuilt from the final plan; don't leave the previous plan's behind
+                state.plan = partial
+                state.plan_arrays = None
+                yield partial
+            if chunk.get("done"):
+                break
+
+    plan = _parse_reply(parser.text)
+    if plan is None:
+        print("❗ Using fallback plan.")
+        plan = _fallback_plan(dest, days)
+    else:
+        plan = _fill_coords(plan, dest)
+        _PLAN_CACHE.set(cache_key, plan, expire=_PLAN_TTL)
+        _remember(intent_key, plan)
+    _set_plan(state, plan)
+    yield plan
+
+
+def itinerary_to_markdown(plan, records=None):
+    """`records` is _plan_to_records(plan), for callers that export more than one format."""
+    if records is None:
+        records = _plan_to_records(plan)
     lines = [f"# Trip to {plan['destination'].get('city','Unknown')}"]
-    for day in plan.get("daily_plan", []):
-        lines.append(f"## {day['date']}")
-        for item in day.get("items", []):
-            lines.append(f"- {item.get('time','')}: {item.get('name','')} ({item.get('type','')}) – {item.get('notes','')}")
+    append, extend = lines.append, lines.extend
+    for day in records:
+        append(f"## {day.date}")
+        extend(
+            f"- {item.time}: {item.name} ({item.type}) – {item.notes}"
+            for item in day.items
+        )
     return "\n".join(lines)
 
-def itinerary_to_ics(plan):
-    from ics import Calendar, Event
-    from datetime import datetime
-    cal = Calendar()
-    for day in plan.get("daily_plan", []):
-        for item in day.get("items", []):
-            e = Event()
-            e.name = item.get("name", "")
-            e.begin = datetime.fromisoformat(day["date"])
-            e.description = item.get("notes", "")
-            cal.events.add(e)
-    return str(cal)
+def _ics_text(value):
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
 
+def _event_uid(name, begin, index):
+    # Same event -> same UID on every export, so calendar clients dedupe re-imports.
+    # `index` (position within the day) keeps two same-named items apart.
+    return hashlib.blake2b(f"{name}|{begin}|{index}".encode(), digest_size=8).hexdigest()
+
+def itinerary_to_ics(plan, records=None):
+    if records is None:
+        records = _plan_to_records(plan)
+    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Big Ears Travel Agent//EN"]
+    for day in records:
+        begin = datetime.fromisoformat(day.date).strftime("%Y%m%dT%H%M%S")
+        for index, item in enumerate(day.items):
+            name = item.name or ""
+            lines.extend([
+                "BEGIN:VEVENT",
+                f"UID:{_event_uid(name, begin, index)}@bigears",
+                f"DTSTAMP:{dtstamp}",
+                f"DTSTART:{begin}",
+                f"SUMMARY:{_ics_text(name)}",
+                f"DESCRIPTION:{_ics_text(item.notes or '')}",
+                "END:VEVENT",
+            ])
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+_OSM_LINK = "https://www.openstreetmap.org/?mlat=%s&mlon=%s&zoom=12"
+
+# Items often share coordinates (the hotel, a repeated stop), so links are memoized
+@functools.lru_cache(maxsize=1024)
 def osm_deeplink(lat, lon):
-    return f"https://www.openstreetmap.org/?mlat={lat}&mlon={lon}&zoom=12"
\ No newline at end of file
+    return _OSM_LINK % (lat, lon)
+
+def osm_deeplinks(lats, lons):
+    """osm_deeplink over whole lat/lon columns, e.g. every item of a month-long plan."""
+    link = _OSM_LINK
+    return [link % pair for pair in zip(lats, lons)]
\ No newline at end of file